@@ -0,0 +1,132 @@
+"""In-process revenue analytics over the sanitized table batches.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Reservations are joined to their room, hotel, chain and
+city once, through hash indexes on ruid, rid and hid, and grouped aggregates
+are computed with vectorized group by and cached until the next load.
+"""
+from typing import Dict, Mapping
+
+import numpy as np
+import pandas as pd
+
+from record_batch import RecordBatch
+from sanitize import Columns
+
+# Reservation attributes revenue can be grouped by.
+GROUPS = ("hid", "chid", "hcity", "payment")
+# Tables whose clean batches the engine is built from.
+TABLES = ("Reserve", "RoomUnavailable", "Room", "Hotel")
+
+
+def hashJoin(keys: np.ndarray, queries: np.ndarray) -> np.ndarray:
+    """Get the position of every query in keys, -1 when it is missing.
+
+    keys are put in a hash table once, every query is a single probe.
+    """
+    return pd.Index(keys).get_indexer(queries)
+
+
+class RevenueEngine:
+    """Grouped reservation aggregates by hotel, chain, city or payment.
+
+    Every reservation is joined Reserve.ruid -> RoomUnavailable.rid ->
+    Room.hid -> Hotel.chid when the batches are loaded. Reservations whose
+    chain of keys is broken are left out of the aggregates and counted in
+    unmatched. Results are cached until reload is called, for example by
+    LoadOrchestrator at the end of a run.
+    """
+
+    def __init__(self, batches: Mapping[str, RecordBatch]):
+        """Construct RevenueEngine.
+
+        :param batches Clean batches of the Reserve, RoomUnavailable, Room
+        and Hotel tables keyed by table name.
+        """
+        self.cache: Dict[str, Columns] = {}
+        if not self.reload(batches):
+            raise ValueError(f"Batches of {TABLES} are needed")
+
+    @classmethod
+    def fromSources(cls) -> "RevenueEngine":
+        """Build the engine from the source files."""
+        from data_extraction import (HotelTableRawData, ReserveTableRawData,
+                                     RoomTableRawData,
+                                     RoomUnavailableTableRawData)
+        return cls({
+            loader.TABLE: loader().getCleanBatch()
+            for loader in (ReserveTableRawData, RoomUnavailableTableRawData,
+                           RoomTableRawData, HotelTableRawData)
+        })
+
+    def reload(self, batches: Mapping[str, RecordBatch]) -> bool:
+        """Join the reservations of new batches and empty the cache.
+
+        Batches of other tables are ignored. Returns False, leaving the
+        engine as it is, when any of the tables it needs is missing.
+        """
+        if any(table not in batches for table in TABLES):
+            return False
+        reserve, unavailable = batches["Reserve"], batches["RoomUnavailable"]
+        rooms, hotels = batches["Room"], batches["Hotel"]
+        stays = hashJoin(unavailable["ruid"], reserve["ruid"])
+        roomRows = np.where(stays >= 0,
+                            hashJoin(rooms["rid"], unavailable["rid"][stays]),
+                            -1)
+        hotelRows = np.where(roomRows >= 0,
+                             hashJoin(hotels["hid"], rooms["hid"][roomRows]),
+                             -1)
+        matched = hotelRows >= 0
+        hotelRows = hotelRows[matched]
+        self.columns: Columns = {
+            "hid": hotels["hid"][hotelRows],
+            "chid": hotels["chid"][hotelRows],
+            "hcity": hotels["hcity"][hotelRows],
+            "payment": reserve["payment"][matched],
+            "total_cost": reserve["total_cost"][matched].astype(np.float64),
+            "guests": reserve["guests"][matched].astype(np.int64),
+        }
+        self.unmatched = int(np.count_nonzero(~matched))
+        self.cache.clear()
+        return True
+
+    def aggregate(self, by: str) -> Columns:
+        """Get reservations, revenue, guests and average cost of every group.
+
+        :param by One of hid, chid, hcity or payment.
+
+        Returns the group keys under by, sorted, with one aggregate per
+        column. Results are served from the cache until the next reload.
+        """
+        if by not in GROUPS:
+            raise ValueError(f"Revenue can be grouped by {GROUPS}: {by}")
+        if by not in self.cache:
+            codes, keys = pd.factorize(self.columns[by], sort=True)
+            groups = len(keys)
+            reservations = np.bincount(codes, minlength=groups)
+            revenue = np.bincount(codes,
+                                  weights=self.columns["total_cost"],
+                                  minlength=groups)
+            guests = np.bincount(codes,
+                                 weights=self.columns["guests"],
+                                 minlength=groups).astype(np.int64)
+            self.cache[by] = {
+                by: np.asarray(keys),
+                "reservations": reservations,
+                "revenue": np.round(revenue, 2),
+                "guests": guests,
+                "average_cost": np.round(revenue / reservations, 2),
+            }
+        return self.cache[by]
+
+    def top(self, by: str, metric: str = "revenue", count: int = 10,
+            ascending: bool = False) -> pd.DataFrame:
+        """Get the count groups with the highest (or lowest) metric."""
+        result = pd.DataFrame(self.aggregate(by))
+        return result.sort_values(metric, ascending=ascending,
+                                  kind="stable").head(count)
+
+    def __str__(self) -> str:
+        """Return string representation of RevenueEngine."""
+        return (f"RevenueEngine({len(self.columns['total_cost'])} "
+                f"reservations, {self.unmatched} unmatched)")
@@ -0,0 +1,231 @@
+"""Room availability index built from the RoomUnavailable records.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. The unavailability intervals of every room are kept in
+sorted NumPy arrays so checking whether a room, or every room of a hotel, is
+free between two dates takes a binary search instead of a SQL scan.
+"""
+from datetime import date
+from typing import Dict, Iterable, Optional, Union
+
+import numpy as np
+import pandas as pd
+
+from database import DatabaseSession
+from record_batch import RecordBatch
+
+Day = Union[date, str, np.datetime64]
+
+# Format of the dates in room_unavailable.csv.
+SOURCE_DATE_FORMAT = "%m/%d/%Y"
+# Intervals are sorted by a single key holding the rid in the high 32 bits
+# and the start day, shifted to be positive, in the low 32 bits.
+DAY_BITS = 32
+DAY_SHIFT = 1 << 31
+
+
+def dayNumber(value: Day) -> int:
+    """Convert a date, ISO string or datetime64 to days since 1970-01-01."""
+    return int(np.datetime64(value, "D").astype(np.int64))
+
+
+def dayNumbers(values: Iterable) -> np.ndarray:
+    """Convert dates, date strings or datetime64 values to day numbers.
+
+    Strings are either ISO dates or M/D/YYYY dates like the source files.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind != "M":
+        try:
+            values = values.astype("datetime64[D]")
+        except ValueError:
+            values = pd.to_datetime(values,
+                                    format=SOURCE_DATE_FORMAT).to_numpy()
+    return values.astype("datetime64[D]").astype(np.int64)
+
+
+def intervalKeys(rids: np.ndarray, days: np.ndarray) -> np.ndarray:
+    """Combine rids and day numbers into the keys the intervals sort by."""
+    return (np.asarray(rids, dtype=np.int64) << DAY_BITS) + (
+        np.asarray(days, dtype=np.int64) + DAY_SHIFT)
+
+
+class AvailabilityIndex:
+    """Unavailability intervals of every room, searchable by date range.
+
+    A room is unavailable every day from startdate to enddate, both
+    included. Intervals are held sorted by (rid, startdate) along with the
+    running maximum of enddate within every room, so a range query is a
+    single binary search per room. Rows added later are kept in a small
+    unsorted buffer that is merged into the sorted arrays once it reaches
+    MERGE_ROWS rows.
+    """
+
+    MERGE_ROWS = 10000
+
+    def __init__(self,
+                 rids: Iterable[int],
+                 starts: Iterable,
+                 ends: Iterable,
+                 roomIds: Iterable[int] = (),
+                 hotelIds: Iterable[int] = ()):
+        """Construct AvailabilityIndex.
+
+        :param rids Room of every unavailability interval.
+        :param starts First unavailable day of every interval.
+        :param ends Last unavailable day of every interval.
+        :param roomIds Rooms known to the index, with hotelIds the hotel of
+        every room. Only these rooms are returned by freeRooms.
+        """
+        self.keys = np.empty(0, dtype=np.int64)
+        # Last day of every sorted interval shifted like the keys, and the
+        # running maximum of it within every room.
+        self.ends = np.empty(0, dtype=np.int64)
+        self.maxEnds = np.empty(0, dtype=np.int64)
+        self.pendingRids = np.empty(0, dtype=np.int64)
+        self.pendingStarts = np.empty(0, dtype=np.int64)
+        self.pendingEnds = np.empty(0, dtype=np.int64)
+        self.hotelRooms: Dict[int, np.ndarray] = {}
+        self.addRooms(roomIds, hotelIds)
+        self.addUnavailable(rids, starts, ends)
+        self.merge()
+
+    @classmethod
+    def fromBatches(cls, rooms: RecordBatch,
+                    unavailable: RecordBatch) -> "AvailabilityIndex":
+        """Build the index from the clean Room and RoomUnavailable batches."""
+        return cls(unavailable["rid"], unavailable["startdate"],
+                   unavailable["enddate"], rooms["rid"], rooms["hid"])
+
+    @classmethod
+    def fromSources(cls) -> "AvailabilityIndex":
+        """Build the index from the rooms.db and room_unavailable.csv files."""
+        from data_extraction import (RoomTableRawData,
+                                     RoomUnavailableTableRawData)
+        return cls.fromBatches(RoomTableRawData().getCleanBatch(),
+                               RoomUnavailableTableRawData().getCleanBatch())
+
+    @classmethod
+    def fromDatabase(cls, conn: DatabaseSession) -> "AvailabilityIndex":
+        """Build the index from the Room and RoomUnavailable tables."""
+        conn.cursor.execute("select rid, hid from Room;")
+        rooms = np.array(conn.cursor.fetchall(), dtype=np.int64).reshape(-1, 2)
+        conn.cursor.execute(
+            "select rid, startdate, enddate from RoomUnavailable;")
+        rows = conn.cursor.fetchall()
+        return cls([row[0] for row in rows], [row[1] for row in rows],
+                   [row[2] for row in rows], rooms[:, 0], rooms[:, 1])
+
+    def addRooms(self, roomIds: Iterable[int], hotelIds: Iterable[int]):
+        """Add rooms to the hotels returned by freeRooms."""
+        roomIds = np.asarray(roomIds, dtype=np.int64)
+        hotelIds = np.asarray(hotelIds, dtype=np.int64)
+        if len(roomIds) != len(hotelIds):
+            raise ValueError("Every room needs a hotel")
+        order = np.argsort(hotelIds, kind="stable")
+        hotels, starts = np.unique(hotelIds[order], return_index=True)
+        for hid, rooms in zip(hotels.tolist(),
+                              np.split(roomIds[order], starts[1:])):
+            if hid in self.hotelRooms:
+                rooms = np.concatenate([self.hotelRooms[hid], rooms])
+            self.hotelRooms[hid] = np.unique(rooms)
+
+    def addUnavailable(self, rids: Iterable[int], starts: Iterable,
+                       ends: Iterable):
+        """Add unavailability intervals, for example after a delta load."""
+        rids = np.asarray(rids, dtype=np.int64)
+        starts, ends = dayNumbers(starts), dayNumbers(ends)
+        if not len(rids) == len(starts) == len(ends):
+            raise ValueError("Every interval needs a room, start and end")
+        self.pendingRids = np.concatenate([self.pendingRids, rids])
+        self.pendingStarts = np.concatenate([self.pendingStarts, starts])
+        self.pendingEnds = np.concatenate([self.pendingEnds, ends])
+        if len(self.pendingRids) >= self.MERGE_ROWS:
+            self.merge()
+
+    def merge(self):
+        """Merge the buffered intervals into the sorted arrays."""
+        if not len(self.pendingRids):
+            return
+        rids = np.concatenate([self.keys >> DAY_BITS, self.pendingRids])
+        keys = np.concatenate(
+            [self.keys,
+             intervalKeys(self.pendingRids, self.pendingStarts)])
+        ends = np.concatenate([self.ends, self.pendingEnds + DAY_SHIFT])
+        order = np.argsort(keys, kind="stable")
+        self.keys, self.ends, rids = keys[order], ends[order], rids[order]
+        # Offsetting every end by its rid keeps the running maximum from
+        # carrying over from one room to the next.
+        self.maxEnds = np.maximum.accumulate(
+            (rids << DAY_BITS) + self.ends) - (rids << DAY_BITS)
+        self.pendingRids = np.empty(0, dtype=np.int64)
+        self.pendingStarts = np.empty(0, dtype=np.int64)
+        self.pendingEnds = np.empty(0, dtype=np.int64)
+
+    def __len__(self) -> int:
+        """Return the number of intervals in the index."""
+        return len(self.keys) + len(self.pendingRids)
+
+    def busyMask(self, rids: Iterable[int], start: Day,
+                 end: Optional[Day] = None) -> np.ndarray:
+        """Return True for every room unavailable on any day of the range.
+
+        :param rids Rooms to check.
+        :param start First day of the range.
+        :param end Last day of the range, the range is the start day alone
+        when omitted.
+        """
+        rids = np.asarray(rids, dtype=np.int64)
+        first = dayNumber(start)
+        last = first if end is None else dayNumber(end)
+        if last < first:
+            raise ValueError(f"Range ends before it starts: {start} {end}")
+        # Last interval of every room starting on or before the last day.
+        positions = np.searchsorted(self.keys, intervalKeys(rids, last),
+                                    "right") - 1
+        found = positions >= 0
+        positions[~found] = 0
+        busy = np.zeros(len(rids), dtype=bool)
+        if len(self.keys):
+            found &= (self.keys[positions] >> DAY_BITS) == rids
+            busy = found & (self.maxEnds[positions] >= first + DAY_SHIFT)
+        if len(self.pendingRids):
+            overlapping = ((self.pendingStarts <= last)
+                           & (self.pendingEnds >= first))
+            busy |= np.isin(rids, self.pendingRids[overlapping])
+        return busy
+
+    def isFree(self, rid: int, start: Day, end: Optional[Day] = None) -> bool:
+        """Check if room rid is free every day from start to end, inclusive.
+
+        Only start is checked when end is omitted.
+        """
+        return not self.busyMask((rid, ), start, end)[0]
+
+    def freeRooms(self,
+                  hid: int,
+                  start: Day,
+                  end: Optional[Day] = None) -> np.ndarray:
+        """Get the sorted rids of hotel hid free every day of the range."""
+        rooms = self.hotelRooms.get(hid, np.empty(0, dtype=np.int64))
+        return rooms[~self.busyMask(rooms, start, end)]
+
+    def freeRoomsByHotel(self,
+                         start: Day,
+                         end: Optional[Day] = None) -> Dict[int, np.ndarray]:
+        """Get the free rooms of every hotel for the same range."""
+        if not self.hotelRooms:
+            return {}
+        hotels = list(self.hotelRooms)
+        rooms = [self.hotelRooms[hid] for hid in hotels]
+        busy = np.split(self.busyMask(np.concatenate(rooms), start, end),
+                        np.cumsum([len(r) for r in rooms])[:-1])
+        return {
+            hid: hotelRooms[~hotelBusy]
+            for hid, hotelRooms, hotelBusy in zip(hotels, rooms, busy)
+        }
+
+    def __str__(self) -> str:
+        """Return string representation of AvailabilityIndex."""
+        return (f"AvailabilityIndex({len(self)} intervals, "
+                f"{len(self.hotelRooms)} hotels)")
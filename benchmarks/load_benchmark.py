@@ -0,0 +1,138 @@
+"""End-to-end load benchmark over synthetic sources of growing size.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Run it from the repository root with
+``python -m benchmarks.load_benchmark [scale ...]`` against the local
+Postgres database, scales 1, 10 and 100 by default. Sources are generated
+with synthetic_data and every loader is timed separately parsing,
+sanitizing and inserting its table, along with the peak growth of resident
+memory during each stage. Every table is truncated before each scale is loaded.
+"""
+import resource
+import sys
+import os
+import tempfile
+import threading
+import time
+from typing import Callable, Dict, List, Sequence, Tuple
+
+from bulk_load import COPY_METHOD
+from database import DatabaseConnection
+from load_orchestrator import LoadOrchestrator
+from synthetic_data import generateSources
+
+STAGES = ("parse", "sanitize", "insert")
+# Interval between two samples of the resident memory of a stage.
+SAMPLE_SECONDS = 0.005
+PAGE_SIZE = os.sysconf("SC_PAGE_SIZE")
+
+
+def residentBytes() -> int:
+    """Get the resident memory of the process, from /proc on Linux."""
+    with open("/proc/self/statm") as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+
+def measured(function: Callable, *args) -> Tuple[object, float, int]:
+    """Call function, returning its result, wall time and peak memory.
+
+    Resident memory is sampled every SAMPLE_SECONDS from another thread
+    while function runs, so the call is timed without tracing overhead. The
+    peak is the largest growth over the resident memory before the call.
+    """
+    before = residentBytes()
+    peak = before
+    done = threading.Event()
+
+    def sample():
+        nonlocal peak
+        while not done.wait(SAMPLE_SECONDS):
+            peak = max(peak, residentBytes())
+
+    sampler = threading.Thread(target=sample, daemon=True)
+    sampler.start()
+    start = time.perf_counter()
+    try:
+        result = function(*args)
+        seconds = time.perf_counter() - start
+    finally:
+        done.set()
+        sampler.join()
+    return result, seconds, max(peak, residentBytes()) - before
+
+
+def truncateTables(database: DatabaseConnection, tables: Sequence[str]):
+    """Empty the tables and forget the state of previous delta loads."""
+    with database.session() as session:
+        session.cursor.execute(
+            f"TRUNCATE {', '.join(tables)}, LoadState CASCADE;")
+
+
+def benchmarkScale(database: DatabaseConnection,
+                   scale: int) -> List[Dict[str, object]]:
+    """Generate sources scale times the fixtures and load every table.
+
+    Returns one result per table with its rows, clean rows, the seconds of
+    every stage and the peak memory growth of the table.
+    """
+    with tempfile.TemporaryDirectory() as directory:
+        start = time.perf_counter()
+        loaders = generateSources(directory, scale)
+        print(f"Generated {scale}x sources in "
+              f"{time.perf_counter() - start:.3f}s")
+        orchestrator = LoadOrchestrator(database, loaders.values())
+        order = orchestrator.getLoadOrder()
+        truncateTables(database, order)
+        results = []
+        for table in order:
+            loader = loaders[table]
+            columns, parse, parsePeak = measured(loader.readColumns)
+            instance, sanitize, sanitizePeak = measured(loader, columns)
+            with database.session() as session:
+                _, insert, insertPeak = measured(
+                    instance.insertSanitizedData, session, COPY_METHOD, False)
+            results.append({
+                "table": table,
+                "rows": len(next(iter(columns.values()))),
+                "clean": len(instance.getCleanBatch()),
+                "parse": parse,
+                "sanitize": sanitize,
+                "insert": insert,
+                "peak": max(parsePeak, sanitizePeak, insertPeak),
+            })
+        with database.session() as session:
+            for loader in loaders.values():
+                loader.finalizeTable(session)
+    return results
+
+
+def report(scale: int, results: List[Dict[str, object]]):
+    """Print the results of a scale, one line per table and a total."""
+    print(f"{'table':<16}{'rows':>10}{'clean':>10}"
+          + "".join(f"{stage:>10}" for stage in STAGES) + f"{'peak MiB':>10}")
+    for result in results:
+        print(f"{result['table']:<16}{result['rows']:>10}{result['clean']:>10}"
+              + "".join(f"{result[stage]:>9.3f}s" for stage in STAGES)
+              + f"{result['peak'] / (1 << 20):>10.1f}")
+    totals = {stage: sum(r[stage] for r in results) for stage in STAGES}
+    print(f"{scale}x total: {sum(r['rows'] for r in results)} rows in "
+          f"{sum(totals.values()):.3f}s ("
+          + ", ".join(f"{stage} {totals[stage]:.3f}s" for stage in STAGES)
+          + ")")
+
+
+def main(scales: Sequence[int] = (1, 10, 100)):
+    """Benchmark the load of every table at every scale."""
+    with DatabaseConnection("db", "uwu", "uwu", "127.0.0.1",
+                            "5432") as database:
+        for scale in scales:
+            report(scale, benchmarkScale(database, scale))
+        database.refreshMaterializedViews()
+    # ru_maxrss is in KiB on Linux.
+    print("Peak resident memory: "
+          f"{resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024:.1f}"
+          " MiB")
+
+
+if __name__ == "__main__":
+    main([int(scale) for scale in sys.argv[1:]] or (1, 10, 100))
@@ -0,0 +1,91 @@
+"""Benchmark of vectorized sanitization against the per-object path.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Run it from the repository root with
+``python -m benchmarks.sanitize_benchmark [scale]``, the Raw_Data sources
+are repeated scale times (100 by default) with distinct primary keys.
+"""
+import sys
+import time
+from operator import attrgetter
+from typing import Callable, Tuple, Type
+
+import numpy as np
+import pandas as pd
+
+from data_extraction import (ReserveTableRawData, RoomTableRawData,
+                             RoomUnavailableTableRawData, TableRawData)
+from sanitize import Columns
+
+# Filters of the original sanitizeData implementations.
+LEGACY_FILTERS = {
+    ReserveTableRawData:
+    lambda x: x.reid is not None and x.ruid is not None and x.clid is not None
+    and x.total_cost is not None and x.payment is not None and x.payment != ""
+    and x.guests is not None and x.guests >= 1,
+    RoomTableRawData:
+    lambda x: x.rid is not None and x.hid is not None and x.rdid is not None
+    and x.rprice is not None and x.rprice > 0,
+    RoomUnavailableTableRawData:
+    lambda x: x.ruid is not None and x.rid is not None and x.startdate is
+    not None and x.enddate is not None and x.enddate >= x.startdate,
+}
+
+
+def tiledColumns(loader: Type[TableRawData], scale: int) -> Columns:
+    """Repeat the source of loader scale times.
+
+    The primary keys of every copy are shifted past those of the previous
+    copies, so the copies are not rejected as duplicate keys.
+    """
+    columns = loader.readColumns()
+    keys = columns[loader.PRIMARY_KEY]
+    keys = keys.astype(np.int64 if keys.dtype.kind in "iu" else np.float64)
+    tiled = {name: np.tile(column, scale) for name, column in columns.items()}
+    tiled[loader.PRIMARY_KEY] = np.tile(keys, scale) + np.repeat(
+        np.arange(scale), len(keys)) * int(np.nanmax(keys))
+    return tiled
+
+
+def legacySanitize(loader: Type[TableRawData], columns: Columns) -> list:
+    """Build one object per row with iterrows and filter with a lambda."""
+    df = pd.DataFrame(columns).astype(object)
+    df = df.where(df.notna(), None)
+    names = loader.getColumns()
+    records = [
+        loader.RECORD(*(row[name] for name in names))
+        for _, row in df.iterrows()
+    ]
+    clean = list(filter(LEGACY_FILTERS[loader], records))
+    return list(map(attrgetter(*names), clean))
+
+
+def vectorizedSanitize(loader: Type[TableRawData], columns: Columns) -> list:
+    """Sanitize with column masks and build rows from the clean columns."""
+    return list(loader(columns).getCleanRows())
+
+
+def timed(function: Callable, *args) -> Tuple[float, int]:
+    """Return the wall time of calling function and its number of rows."""
+    start = time.perf_counter()
+    rows = len(function(*args))
+    return time.perf_counter() - start, rows
+
+
+def main(scale: int = 100):
+    """Compare both sanitization paths on sources repeated scale times."""
+    for loader in LEGACY_FILTERS:
+        columns = tiledColumns(loader, scale)
+        rows = len(next(iter(columns.values())))
+        legacy, legacyRows = timed(legacySanitize, loader, columns)
+        vectorized, cleanRows = timed(vectorizedSanitize, loader, columns)
+        if legacyRows != cleanRows:
+            raise AssertionError(f"{loader.TABLE}: per-object path kept "
+                                 f"{legacyRows} rows, vectorized {cleanRows}")
+        print(f"{loader.TABLE}: {rows} rows ({cleanRows} clean), "
+              f"per-object {legacy:.3f}s, vectorized {vectorized:.3f}s "
+              f"({legacy / vectorized:.1f}x)")
+
+
+if __name__ == "__main__":
+    main(int(sys.argv[1]) if len(sys.argv) > 1 else 100)
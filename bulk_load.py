@@ -0,0 +1,252 @@
+"""Bulk loading module for inserting sanitized records into PostgreSQL.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Records are streamed into the database with
+``COPY ... FROM STDIN`` and, when COPY is unavailable, with batched multi-row
+``INSERT ... VALUES`` statements.
+"""
+import io
+import time
+from datetime import date, datetime
+from itertools import islice
+from typing import Iterable, Iterator, List, Optional, Sequence, Tuple
+
+import psycopg2.errors
+from psycopg2.extras import execute_values
+
+from database import DatabaseSession
+
+COPY_METHOD = "copy"
+VALUES_METHOD = "values"
+ROW_METHOD = "row"
+# Errors meaning the server refuses COPY itself rather than the rows sent.
+COPY_UNAVAILABLE = (psycopg2.errors.FeatureNotSupported,
+                    psycopg2.errors.InsufficientPrivilege)
+
+
+def formatCsvValue(value) -> str:
+    """Return value formatted as a field of a PostgreSQL CSV COPY stream.
+
+    None is written as an unquoted empty field, which COPY reads as NULL,
+    while strings are always quoted so empty strings stay empty strings.
+    """
+    if value is None:
+        return ""
+    if isinstance(value, str):
+        return '"' + value.replace('"', '""') + '"'
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    if isinstance(value, (date, datetime)):
+        return value.isoformat()
+    return str(value)
+
+
+def formatCsvRows(rows: Iterable[Sequence]) -> str:
+    """Return rows formatted as the body of a PostgreSQL CSV COPY stream."""
+    return "".join(",".join(map(formatCsvValue, row)) + "\n" for row in rows)
+
+
+class BulkLoadStats:
+    """Class used to represent the outcome of loading a single table."""
+
+    def __init__(self, table: str, rows: int, seconds: float, method: str):
+        """Construct BulkLoadStats.
+
+        :param table Name of the table that was loaded.
+        :param rows Number of rows sent to the database.
+        :param seconds Wall time spent sending and committing the rows.
+        :param method Insert method used (copy, values or row).
+        """
+        self.table = table
+        self.rows = rows
+        self.seconds = seconds
+        self.method = method
+
+    @property
+    def rowsPerSecond(self) -> float:
+        """Return the insert throughput in rows per second."""
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
+
+    def __str__(self) -> str:
+        """Return string representation of BulkLoadStats."""
+        return (f"{self.table}: {self.rows} rows in {self.seconds:.3f}s "
+                f"({self.rowsPerSecond:.0f} rows/s, {self.method})")
+
+
+class BulkLoader:
+    """Insert records into a table with a single commit per table.
+
+    The default method streams rows with COPY. If the server rejects COPY the
+    current batch is retried, and the rest of the table is sent, with
+    multi-row VALUES statements. The per-row method reproduces the original
+    one INSERT per record path and is kept for comparison.
+    """
+
+    BATCH_ROWS = 50000
+    VALUES_PAGE_SIZE = 1000
+
+    def __init__(self,
+                 conn: DatabaseSession,
+                 method: str = COPY_METHOD,
+                 verbose: bool = True,
+                 batchRows: Optional[int] = None):
+        """Construct BulkLoader.
+
+        :param conn Database connection that receives the records.
+        :param method One of copy, values or row.
+        :param verbose Print the throughput of every loaded table.
+        :param batchRows Rows held in memory and sent per batch, BATCH_ROWS
+        by default.
+        """
+        if method not in (COPY_METHOD, VALUES_METHOD, ROW_METHOD):
+            raise ValueError(f"Unknown bulk load method: {method}")
+        self.conn = conn
+        self.method = method
+        self.verbose = verbose
+        self.batchRows = batchRows or self.BATCH_ROWS
+
+    def loadRecords(self, table: str, columns: Sequence[str],
+                    rows: Iterable[Sequence]) -> BulkLoadStats:
+        """Insert rows into table and commit once at the end.
+
+        :param table Name of the destination table.
+        :param columns Column names in the same order as the row values.
+        :param rows Iterable of row tuples, consumed in batches.
+        """
+        start = time.perf_counter()
+        count = self.sendRecords(table, columns, rows)
+        self.conn.conn.commit()
+        stats = BulkLoadStats(table, count,
+                              time.perf_counter() - start, self.method)
+        if self.verbose:
+            print(stats)
+        return stats
+
+    def loadPartitions(
+            self, table: str, columns: Sequence[str],
+            partitions: Iterable[Tuple[str, Iterable[Sequence]]]
+    ) -> BulkLoadStats:
+        """Insert rows straight into the partitions of table, committing once.
+
+        :param partitions Pairs of partition name and the rows it holds,
+        every partition is sent on its own so the server doesn't route rows.
+        """
+        start = time.perf_counter()
+        count = sum(
+            self.sendRecords(partition, columns, rows)
+            for partition, rows in partitions)
+        self.conn.conn.commit()
+        stats = BulkLoadStats(table, count,
+                              time.perf_counter() - start,
+                              f"{self.method} partitions")
+        if self.verbose:
+            print(stats)
+        return stats
+
+    def upsertRecords(self, table: str, columns: Sequence[str],
+                      rows: Iterable[Sequence], key: str,
+                      replace: bool = False) -> BulkLoadStats:
+        """Insert rows into table, updating the rows that share their key.
+
+        Rows are streamed into a temporary staging table and merged with a
+        single INSERT ... ON CONFLICT DO UPDATE, committed once at the end.
+        The table must have a primary key or unique constraint on key.
+
+        :param replace Delete the rows sharing a key with the staged rows
+        and insert the staged rows instead, for tables without a unique
+        constraint on key alone like partitioned tables.
+        """
+        start = time.perf_counter()
+        stage = f"{table}_stage"
+        self.conn.cursor.execute(f"""CREATE TEMP TABLE {stage}
+        (LIKE {table}) ON COMMIT DROP;""")
+        count = self.sendRecords(stage, columns, rows)
+        names = ", ".join(columns)
+        values = [column for column in columns if column != key]
+        updates = ", ".join(f"{column} = EXCLUDED.{column}"
+                            for column in values)
+        if replace:
+            self.conn.cursor.execute(
+                f"""DELETE FROM {table} t USING {stage} s
+                WHERE t.{key} = s.{key};
+                INSERT INTO {table} ({names}) SELECT {names} FROM {stage};""")
+        else:
+            # Rows equal to the staged ones are left as they are.
+            self.conn.cursor.execute(
+                f"""INSERT INTO {table} AS t ({names})
+                SELECT {names} FROM {stage}
+                ON CONFLICT ({key}) DO UPDATE SET {updates}
+                WHERE (t.{', t.'.join(values)})
+                IS DISTINCT FROM (EXCLUDED.{', EXCLUDED.'.join(values)});""")
+        self.conn.conn.commit()
+        stats = BulkLoadStats(table, count,
+                              time.perf_counter() - start,
+                              f"{self.method} upsert")
+        if self.verbose:
+            print(stats)
+        return stats
+
+    def sendRecords(self, table: str, columns: Sequence[str],
+                    rows: Iterable[Sequence]) -> int:
+        """Send rows to table without committing and return the row count."""
+        count = 0
+        for batch in self.batches(rows):
+            if self.method == COPY_METHOD:
+                self.copyBatch(table, columns, batch)
+            elif self.method == VALUES_METHOD:
+                self.insertValues(table, columns, batch)
+            else:
+                self.insertRows(table, columns, batch)
+            count += len(batch)
+        return count
+
+    def batches(self, rows: Iterable[Sequence]) -> Iterator[List[Sequence]]:
+        """Split rows into lists of at most batchRows rows."""
+        iterator = iter(rows)
+        while True:
+            batch = list(islice(iterator, self.batchRows))
+            if not batch:
+                return
+            yield batch
+
+    def copyBatch(self, table: str, columns: Sequence[str],
+                  batch: List[Sequence]):
+        """Stream a batch with COPY, falling back to VALUES if COPY is refused.
+
+        Only errors meaning COPY can't be used, like a missing privilege,
+        switch the loader to VALUES. Errors caused by the rows themselves
+        are raised once the batch is rolled back.
+        """
+        cursor = self.conn.cursor
+        cursor.execute("SAVEPOINT bulk_copy;")
+        try:
+            cursor.copy_expert(
+                f"COPY {table} ({', '.join(columns)}) "
+                "FROM STDIN WITH (FORMAT csv, ENCODING 'UTF8')",
+                io.BytesIO(formatCsvRows(batch).encode("utf-8")))
+        except psycopg2.Error as e:
+            cursor.execute("ROLLBACK TO SAVEPOINT bulk_copy;")
+            if not isinstance(e, COPY_UNAVAILABLE):
+                raise
+            print(f"COPY into {table} failed, using VALUES instead:", e)
+            self.method = VALUES_METHOD
+            self.insertValues(table, columns, batch)
+        else:
+            cursor.execute("RELEASE SAVEPOINT bulk_copy;")
+
+    def insertValues(self, table: str, columns: Sequence[str],
+                     batch: List[Sequence]):
+        """Insert a batch with multi-row INSERT ... VALUES statements."""
+        execute_values(self.conn.cursor,
+                       f"INSERT INTO {table} ({', '.join(columns)}) VALUES %s",
+                       batch,
+                       page_size=self.VALUES_PAGE_SIZE)
+
+    def insertRows(self, table: str, columns: Sequence[str],
+                   batch: List[Sequence]):
+        """Insert a batch with one INSERT statement per record."""
+        placeholders = ",".join(["%s"] * len(columns))
+        for record in batch:
+            self.conn.cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) "
+                f"VALUES ({placeholders})", record)
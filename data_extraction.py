@@ -4,13 +4,609 @@ This module was developed for the term project - Hotel Analytics Systems for
 CIIC4060/ICOM 5016. This module is exclusively for implementing the objectives
 in phase 1 of the project.
 """
-import sqlite3
-from typing import List
-from database import DatabaseConnection
+import io
+import json
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple, Type, Union
+from database import (PARTITION_INTERVALS, PARTITIONED_TABLES,
+                      DatabaseConnection, DatabaseSession, partitionStarts)
+from bulk_load import COPY_METHOD, BulkLoader, BulkLoadStats
+from source_readers import (chunked, iterJsonArray, iterSqliteChunks,
+                            iterXlsxRows, querySqliteRow)
+from sanitize import (KEEP_FIRST, AtLeast, Columns, GreaterThan, NonEmpty,
+                      NotBefore, NotNull, Rule, SortedKeys, duplicateKeys,
+                      sanitizeColumns)
+from record_batch import (COLUMN_DTYPES, DATE_DTYPE, RecordBatch,
+                          compactColumn)
 from datetime import date
 
+import numpy as np
 import pandas as pd
 
+# Values of the boolean columns of the JSON sources, like handicap.
+BOOLEAN_VALUES = {0: False, 1: True, "false": False, "true": True}
+
+
+def parseDates(values: np.ndarray, dateFormat: str) -> np.ndarray:
+    """Parse date strings of dateFormat into datetime64 days.
+
+    Every distinct string is parsed once and the result is shared by its
+    repetitions. Missing and malformed values become NaT. Values that are
+    already dates are converted as they are.
+    """
+    values = np.asarray(values)
+    if values.dtype.kind == "M":
+        return values.astype(DATE_DTYPE)
+    codes, uniques = pd.factorize(values)
+    if uniques.dtype.kind == "M":
+        parsed = np.asarray(uniques, dtype=DATE_DTYPE)
+    else:
+        parsed = pd.to_datetime(uniques.astype(str),
+                                format=dateFormat,
+                                errors="coerce").to_numpy(DATE_DTYPE)
+    days = np.full(len(values), np.datetime64("NaT"), dtype=DATE_DTYPE)
+    present = codes >= 0
+    days[present] = parsed[codes[present]]
+    return days
+
+
+def emptyColumns(names: Sequence[str]) -> Columns:
+    """Return columns without any rows, used when a source can't be read."""
+    return {name: np.empty(0, dtype=object) for name in names}
+
+
+class TableRawData:
+    """Base class for the loaders that sanitize and insert a source file.
+
+    Subclasses declare the destination TABLE, its SCHEMA as (column, type)
+    pairs in insertion order, its PRIMARY_KEY and the RECORD data class
+    whose attributes are named after the columns. Every column must be
+    present, SANITIZE_RULES adds the table specific checks.
+    """
+
+    TABLE = ""
+    SCHEMA: Tuple[Tuple[str, type], ...] = ()
+    PRIMARY_KEY = ""
+    # Room and Reserve were created without a primary key before the schema
+    # was versioned, it is added once all of the records have been inserted.
+    ADD_PRIMARY_KEY = False
+    # Data class built for every record, its arguments follow SCHEMA.
+    RECORD: type = object
+    SANITIZE_RULES: Tuple[Rule, ...] = ()
+    # Path of the source file and, for csv, json and xlsx sources, the map of
+    # table column name to source column name.
+    SOURCE = ""
+    SOURCE_COLUMNS: Dict[str, str] = {}
+    # Format of the date columns of the source.
+    DATE_FORMAT = "%Y-%m-%d"
+    # Default number of rows read, sanitized and sent per chunk when loading
+    # a source incrementally.
+    CHUNK_SIZE = 50000
+    # Rows kept among the clean rows sharing a primary key, KEEP_FIRST,
+    # KEEP_LAST or REJECT_ALL.
+    DUPLICATE_POLICY = KEEP_FIRST
+
+    def __init__(self,
+                 columns: Optional[Columns] = None,
+                 rejected: Optional[Dict[str, int]] = None,
+                 sourceRejected: Optional[Dict[str, int]] = None):
+        """Read the source file and sanitize its records.
+
+        :param columns Columns already returned by readColumns, for example
+        by a worker process. The source file is read when omitted.
+        :param rejected Rows rejected by every rule when columns are the
+        typed columns of a clean batch, like the ones kept by SourceCache.
+        Such columns are used as they are, without sanitizing them again.
+        :param sourceRejected Rows the reader left out of columns, counted
+        by rule as returned by readSource. They are counted along with the
+        rows rejected by sanitization.
+        """
+        if rejected is not None:
+            self.rejected = dict(rejected)
+            self.cleanBatch = RecordBatch.fromTyped(self.SCHEMA, columns)
+            self.cleanData = None
+            return
+        if columns is None:
+            columns, sourceRejected = self.readSource()
+        columns, self.rejected = sanitizeColumns(columns,
+                                                 self.getSanitizeRules())
+        for label, count in (sourceRejected or {}).items():
+            self.rejected[label] = self.rejected.get(label, 0) + count
+        columns = self.rejectDuplicateKeys(columns)
+        self.cleanBatch = RecordBatch(self.SCHEMA, columns)
+        self.cleanData = None
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Read the source file into columns named after the table columns.
+
+        Only depends on the class so it can run in a separate process.
+        """
+        raise NotImplementedError
+
+    @classmethod
+    def readSource(cls) -> Tuple[Columns, Dict[str, int]]:
+        """Read the source file along with the rows the reader rejected.
+
+        Returns the columns of readColumns and the rows left out by readers
+        that apply sanitize rules themselves, counted by rule, which is
+        empty for the other readers. Only depends on the class so it can run
+        in a separate process.
+        """
+        return cls.readColumns(), {}
+
+    @classmethod
+    def iterColumns(cls, chunkSize: int = CHUNK_SIZE) -> Iterator[Columns]:
+        """Yield the source file in columns of at most chunkSize rows.
+
+        Sources without an incremental reader are read whole and sliced.
+        """
+        columns = cls.readColumns()
+        rows = len(next(iter(columns.values())))
+        for start in range(0, rows, chunkSize):
+            yield {
+                name: column[start:start + chunkSize]
+                for name, column in columns.items()
+            }
+
+    @classmethod
+    def readNewColumns(cls, offset: int = 0) -> Columns:
+        """Read the source rows appended after byte offset.
+
+        :param offset Size of the source file at the previous load when the
+        file has only been appended to since. Sources that can only be read
+        from their start ignore it and read every row.
+        """
+        return cls.readColumns()
+
+    @classmethod
+    def frameColumns(cls, df: pd.DataFrame) -> Columns:
+        """Convert a source DataFrame into columns named after the table.
+
+        Integer and boolean columns without missing values are cast to their
+        table type and date columns are parsed with DATE_FORMAT. Incomplete
+        rows are kept, sanitization removes them.
+        """
+        columns = {}
+        for column, columnType in cls.SCHEMA:
+            values = df[cls.SOURCE_COLUMNS[column]]
+            if columnType is date:
+                columns[column] = parseDates(values.to_numpy(),
+                                             cls.DATE_FORMAT)
+                continue
+            if columnType in (int, bool) and not values.isna().any():
+                values = values.astype(columnType)
+            columns[column] = compactColumn(values.to_numpy())
+        return columns
+
+    @classmethod
+    def getColumns(cls) -> List[str]:
+        """Get the destination column names in insertion order."""
+        return [column for column, _ in cls.SCHEMA]
+
+    @classmethod
+    def getSanitizeRules(cls) -> List[Rule]:
+        """Get the rules every clean row satisfies, in evaluation order."""
+        return [NotNull(column)
+                for column in cls.getColumns()] + list(cls.SANITIZE_RULES)
+
+    def rejectDuplicateKeys(self, columns: Columns) -> Columns:
+        """Apply DUPLICATE_POLICY to the rows sharing a primary key.
+
+        Only the rows given are compared, loadStreaming checks the keys of
+        a chunk against the previous chunks itself. Prints a summary of the
+        conflicts and counts the rejected rows under getDuplicateLabel.
+        """
+        keys = columns[self.PRIMARY_KEY]
+        rejected, shared = duplicateKeys(keys, self.DUPLICATE_POLICY)
+        label = self.getDuplicateLabel()
+        self.rejected[label] = int(np.count_nonzero(rejected))
+        if not len(shared):
+            return columns
+        sample = ", ".join(str(key) for key in np.sort(shared)[:5])
+        print(f"{self.TABLE}: {len(shared)} {self.PRIMARY_KEY} values shared"
+              f" by {np.count_nonzero(np.isin(keys, shared))} rows "
+              f"({sample}{', ...' if len(shared) > 5 else ''}), "
+              f"{self.rejected[label]} rejected by {self.DUPLICATE_POLICY}")
+        return {name: column[~rejected] for name, column in columns.items()}
+
+    @classmethod
+    def getDuplicateLabel(cls) -> str:
+        """Get the name rows rejected by DUPLICATE_POLICY are counted under."""
+        return f"UniqueKey({cls.PRIMARY_KEY}, {cls.DUPLICATE_POLICY})"
+
+    def getRejectedCount(self) -> int:
+        """Get the number of source rows removed by sanitization."""
+        return sum(self.rejected.values())
+
+    def getCleanColumns(self) -> Columns:
+        """Get sanitized columns from the source file."""
+        return self.cleanBatch.columns
+
+    def getCleanBatch(self) -> RecordBatch:
+        """Get sanitized records from the source file as a RecordBatch."""
+        return self.cleanBatch
+
+    def getCleanData(self, asBatch: bool = False) -> Union[list, RecordBatch]:
+        """Get sanitized records from the source file.
+
+        :param asBatch Return the columnar RecordBatch instead of a list of
+        record objects. Record objects are only built the first time they
+        are requested.
+        """
+        if asBatch:
+            return self.cleanBatch
+        if self.cleanData is None:
+            self.cleanData = self.cleanBatch.toRecords(self.RECORD)
+        return self.cleanData
+
+    def getCleanRows(self) -> Iterator[tuple]:
+        """Get sanitized rows as tuples of the column types.
+
+        Rows are built straight from the clean columns, without going
+        through record objects.
+        """
+        return self.cleanBatch.rows()
+
+    def dropRows(self, mask: np.ndarray, reason: str) -> RecordBatch:
+        """Remove clean rows after sanitization, counting them as rejected.
+
+        :param mask True for every row of the clean batch to remove.
+        :param reason Name the removed rows are counted under in rejected.
+
+        Returns the removed rows.
+        """
+        dropped = self.cleanBatch[mask]
+        self.cleanBatch = self.cleanBatch[~mask]
+        self.cleanData = None
+        self.rejected[reason] = self.rejected.get(reason, 0) + len(dropped)
+        return dropped
+
+    @classmethod
+    def loadStreaming(cls,
+                      conn: DatabaseSession,
+                      chunkSize: int = CHUNK_SIZE,
+                      method: str = COPY_METHOD,
+                      finalize: bool = True) -> BulkLoadStats:
+        """Read, sanitize and insert the source one chunk at a time.
+
+        Only one chunk of the source is held in memory at once and the whole
+        table is still committed once. The primary keys of the chunks
+        already sent are kept in a SortedKeys, so a key repeated in a later
+        chunk is rejected too. Rows already sent can't be taken back, which only
+        leaves KEEP_FIRST as a DUPLICATE_POLICY for streamed sources.
+        """
+        if cls.DUPLICATE_POLICY != KEEP_FIRST:
+            raise ValueError(f"{cls.TABLE} can't be streamed with the "
+                             f"{cls.DUPLICATE_POLICY} duplicate key policy")
+        column = cls.getPartitionColumn(conn)
+        seen = SortedKeys()
+        repeated = 0
+
+        def cleanRows() -> Iterator[tuple]:
+            nonlocal repeated
+            for columns in cls.iterColumns(chunkSize):
+                loaded = cls(columns)
+                keys = loaded.getCleanBatch()[cls.PRIMARY_KEY]
+                mask = seen.contains(keys)
+                if mask.any():
+                    repeated += len(loaded.dropRows(
+                        mask, cls.getDuplicateLabel()))
+                    keys = keys[~mask]
+                seen.add(keys)
+                if column is not None:
+                    # Rows are routed by the server, their partitions must
+                    # exist before the chunk is sent.
+                    conn.createPartitions(cls.TABLE,
+                                          loaded.getCleanBatch()[column])
+                yield from loaded.getCleanRows()
+
+        stats = BulkLoader(conn, method, batchRows=chunkSize).loadRecords(
+            cls.TABLE, cls.getColumns(), cleanRows())
+        if repeated:
+            print(f"{cls.TABLE}: {repeated} rows repeat a {cls.PRIMARY_KEY} "
+                  f"of an earlier chunk, rejected by {KEEP_FIRST}")
+        if finalize:
+            cls.finalizeTable(conn)
+        return stats
+
+    def insertSanitizedData(self,
+                            conn: DatabaseSession,
+                            method: str = COPY_METHOD,
+                            finalize: bool = True) -> BulkLoadStats:
+        """Insert clean data into the table with a single commit.
+
+        Adds the primary key constraint when the table is created without
+        one and resets the sequence to max after all data has been inserted.
+        With finalize set to False both steps are left to the caller, which
+        must call finalizeTable once every table has been loaded. Partitioned
+        tables are loaded one partition at a time, see insertPartitions.
+        """
+        if self.getPartitionColumn(conn) is not None:
+            stats = self.insertPartitions(conn, method)
+        else:
+            stats = BulkLoader(conn, method).loadRecords(self.TABLE,
+                                                         self.getColumns(),
+                                                         self.getCleanRows())
+        if finalize:
+            self.finalizeTable(conn)
+        return stats
+
+    def insertPartitions(self,
+                         conn: DatabaseSession,
+                         method: str = COPY_METHOD) -> BulkLoadStats:
+        """Insert clean data straight into the partitions of the table.
+
+        Missing partitions are created first, then the rows of every
+        partition are sent with a single commit for the whole table.
+        """
+        column, interval = PARTITIONED_TABLES[self.TABLE]
+        dates = self.cleanBatch[column]
+        names = conn.createPartitions(self.TABLE, dates)
+        starts = dates.astype(PARTITION_INTERVALS[interval][0])
+        order = np.argsort(starts, kind="stable")
+        bounds = np.searchsorted(starts[order],
+                                 partitionStarts(dates, interval)[1:])
+        return BulkLoader(conn, method).loadPartitions(
+            self.TABLE, self.getColumns(),
+            [(name, self.cleanBatch[rows].rows())
+             for name, rows in zip(names, np.split(order, bounds))])
+
+    @classmethod
+    def getPartitionColumn(cls, conn: DatabaseSession) -> Optional[str]:
+        """Get the partition column of the table if conn has it partitioned."""
+        if cls.TABLE not in PARTITIONED_TABLES or not conn.isPartitioned(
+                cls.TABLE):
+            return None
+        return PARTITIONED_TABLES[cls.TABLE][0]
+
+    @classmethod
+    def finalizeTable(cls, conn: DatabaseSession):
+        """Add the primary key if needed and reset its sequence to max."""
+        if cls.ADD_PRIMARY_KEY and not conn.hasPrimaryKey(cls.TABLE):
+            conn.cursor.execute(f"""ALTER TABLE {cls.TABLE}
+            ADD PRIMARY KEY ({cls.PRIMARY_KEY});""")
+            conn.conn.commit()
+        conn.cursor.execute(f"select max({cls.PRIMARY_KEY}) from {cls.TABLE};")
+        maxId = conn.cursor.fetchone()[0]
+        if maxId is None:
+            return
+        conn.cursor.execute(
+            f"""ALTER SEQUENCE {cls.TABLE}_{cls.PRIMARY_KEY}_seq
+        restart with %s;""", (int(maxId) + 1, ))
+        conn.conn.commit()
+
+
+def integerValues(numbers: np.ndarray) -> np.ndarray:
+    """Convert float64 numbers of an integer column to integers.
+
+    Values that are not integral become NaN, the numbers then stay floats.
+    Integers that are all present use the smallest integer type holding
+    them.
+    """
+    numbers[~np.isfinite(numbers) | (numbers != np.round(numbers))] = np.nan
+    if np.isnan(numbers).any():
+        return numbers
+    return compactColumn(numbers.astype(np.int64))
+
+
+def coerceValues(values: list, columnType: type) -> np.ndarray:
+    """Convert the parsed values of a column to the array of columnType.
+
+    Values that can't be converted become missing, NaN for numbers and
+    None otherwise, so sanitization rejects their rows. Integers that are
+    all present use the smallest integer type holding them.
+    """
+    if columnType in (int, float):
+        # JSON true and false are not numbers.
+        values = [None if isinstance(value, bool) else value
+                  for value in values]
+        try:
+            numbers = np.array(values, dtype=np.float64)
+        except (TypeError, ValueError):
+            numbers = pd.to_numeric(pd.Series(values, dtype=object),
+                                    errors="coerce").to_numpy(np.float64)
+        if columnType is float:
+            return numbers
+        return integerValues(numbers)
+    if columnType is bool:
+        flags = [
+            value if isinstance(value, bool) else
+            BOOLEAN_VALUES.get(value) if isinstance(value, (int, str)) else
+            None for value in values
+        ]
+        if None in flags:
+            return np.array(flags, dtype=object)
+        return np.array(flags, dtype=np.bool_)
+    strings = [
+        value if value is None or isinstance(value, str) else str(value)
+        for value in values
+    ]
+    return np.array(strings, dtype=object)
+
+
+def jsonRecordColumns(loader: Type[TableRawData],
+                      records: Sequence) -> Columns:
+    """Build the typed columns of loader from parsed JSON objects.
+
+    Every column is converted to its SCHEMA type, elements that are not
+    objects leave every column of their row missing.
+    """
+    return {
+        column: coerceValues([
+            record.get(loader.SOURCE_COLUMNS[column])
+            if isinstance(record, dict) else None for record in records
+        ], columnType)
+        for column, columnType in loader.SCHEMA
+    }
+
+
+def iterJsonColumns(loader: Type[TableRawData],
+                    chunkSize: int) -> Iterator[Columns]:
+    """Parse the JSON array source of loader in chunks of chunkSize rows.
+
+    Only one chunk of objects is held in memory at a time.
+    """
+    for records in chunked(iterJsonArray(loader.SOURCE), chunkSize):
+        yield jsonRecordColumns(loader, records)
+
+
+def readJsonColumns(loader: Type[TableRawData]) -> Columns:
+    """Parse the whole JSON array source of loader into typed columns.
+
+    The file is decoded at once, which is faster than the incremental
+    reader used by iterJsonColumns when the whole array is kept anyway.
+    """
+    with open(loader.SOURCE, encoding="utf-8") as file:
+        records = json.load(file)
+    if not isinstance(records, list):
+        raise ValueError(f"{loader.SOURCE} does not contain a JSON array")
+    return jsonRecordColumns(loader, records)
+
+
+def iterXlsxColumns(loader: Type[TableRawData],
+                    chunkSize: int) -> Iterator[Columns]:
+    """Parse the xlsx source of loader in chunks of chunkSize rows."""
+    rows = iterXlsxRows(loader.SOURCE)
+    header = next(rows, None)
+    if header is None:
+        return
+    for records in chunked(rows, chunkSize):
+        yield loader.frameColumns(
+            pd.DataFrame.from_records(records, columns=header))
+
+
+def readXlsxColumns(loader: Type[TableRawData]) -> Columns:
+    """Read the whole xlsx source of loader with the streaming reader."""
+    rows = iterXlsxRows(loader.SOURCE)
+    header = next(rows, None)
+    if header is None:
+        return emptyColumns(loader.getColumns())
+    return loader.frameColumns(
+        pd.DataFrame.from_records(list(rows), columns=header))
+
+
+def sqliteRules(loader: Type[TableRawData]) -> List[Rule]:
+    """Get the sanitize rules of loader that have an SQL form, in order."""
+    return [rule for rule in loader.getSanitizeRules()
+            if rule.sql() is not None]
+
+
+def sqliteQuery(loader: Type[TableRawData]) -> str:
+    """Get the QUERY of loader with its sanitize rules as a WHERE clause.
+
+    Rows failing a rule with an SQL form are filtered by sqlite and never
+    reach Python, countSqliteRejected counts them. The other rules still
+    run on the columns read.
+    """
+    rules = sqliteRules(loader)
+    # The other conditions of a column already reject its NULLs.
+    checked = {rule.column for rule in rules if not isinstance(rule, NotNull)}
+    predicates = [
+        rule.sql() for rule in rules
+        if not isinstance(rule, NotNull) or rule.column not in checked
+    ]
+    if not predicates:
+        return loader.QUERY
+    return (f"{loader.QUERY} where " +
+            " and ".join(f"({predicate})" for predicate in predicates))
+
+
+def countSqliteRejected(loader: Type[TableRawData]) -> Dict[str, int]:
+    """Count the rows sqliteQuery leaves out, by sanitize rule.
+
+    A single aggregate counts every row under the first SQL rule it fails,
+    the way sanitizeColumns counts the rules it runs.
+    """
+    rules = sqliteRules(loader)
+    if not rules:
+        return {}
+    passed = [f"coalesce(({rule.sql()}), 0)" for rule in rules]
+    counts = [
+        "count(*) filter (where " +
+        " and ".join(passed[:index] + [f"not {passed[index]}"]) + ")"
+        for index in range(len(rules))
+    ]
+    row = querySqliteRow(
+        loader.SOURCE, f"select {', '.join(counts)} from ({loader.QUERY})")
+    return {str(rule): count for rule, count in zip(rules, row)}
+
+
+def sqliteColumns(loader: Type[TableRawData],
+                  rows: Sequence[tuple]) -> Columns:
+    """Convert rows of a sqlite source into arrays of the column types.
+
+    The rows are copied into a structured array in a single call, integer
+    columns as floats so values that are not integral become NaN instead of
+    being truncated. Values sqlite returns with another type, which its
+    column affinity allows, are coerced one column at a time instead.
+    """
+    rowType = np.dtype([
+        (name, np.float64 if columnType is int else
+         COLUMN_DTYPES.get(columnType, object))
+        for name, columnType in loader.SCHEMA
+    ])
+    try:
+        typed = np.array(rows, dtype=rowType)
+    except (TypeError, ValueError, OverflowError):
+        values = list(zip(*rows)) if rows else [()] * len(loader.SCHEMA)
+        return {
+            name: coerceValues(list(column), columnType)
+            for (name, columnType), column in zip(loader.SCHEMA, values)
+        }
+    return {
+        name: integerValues(typed[name].copy()) if columnType is int else
+        np.ascontiguousarray(typed[name])
+        for name, columnType in loader.SCHEMA
+    }
+
+
+def iterSqliteColumns(loader: Type[TableRawData],
+                      chunkSize: int = TableRawData.CHUNK_SIZE
+                      ) -> Iterator[Columns]:
+    """Yield the clean rows of a sqlite source in typed chunks.
+
+    The sqlite connection is closed once the records are read so the loader
+    can be used and released from any thread.
+    """
+    for rows in iterSqliteChunks(loader.SOURCE, sqliteQuery(loader),
+                                 chunkSize):
+        yield sqliteColumns(loader, rows)
+
+
+def readSqliteColumns(loader: Type[TableRawData]) -> Columns:
+    """Run the QUERY of loader and type the rows it returns.
+
+    Rows are fetched and typed in chunks of CHUNK_SIZE rows, see
+    sqliteQuery for the rows left out.
+    """
+    chunks = [
+        sqliteColumns(loader, rows) for rows in iterSqliteChunks(
+            loader.SOURCE, sqliteQuery(loader), loader.CHUNK_SIZE)
+    ] or [sqliteColumns(loader, [])]
+    return {
+        name: compactColumn(
+            np.concatenate([chunk[name] for chunk in chunks]))
+        for name in loader.getColumns()
+    }
+
+
+def readCsvColumns(loader: Type[TableRawData], offset: int = 0) -> Columns:
+    """Read the csv source of loader starting at byte offset.
+
+    The header line is always read from the start of the file so rows
+    appended after offset keep their column names.
+    """
+    if not offset:
+        return loader.frameColumns(pd.read_csv(loader.SOURCE))
+    with open(loader.SOURCE, "rb") as file:
+        header = pd.read_csv(io.BytesIO(file.readline())).columns
+        file.seek(offset)
+        tail = file.read()
+    if not tail.strip():
+        return emptyColumns(loader.getColumns())
+    return loader.frameColumns(
+        pd.read_csv(io.BytesIO(tail), header=None, names=header))
+
 
 class ReserveTableData:
     """Data class used to represent the records inside of the reserve table.
@@ -47,59 +643,42 @@ class ReserveTableData:
         return s
 
 
-class ReserveTableRawData:
+class ReserveTableRawData(TableRawData):
     """Class to connect to reserve.db sqlite database and sanitize entries."""
 
-    def __init__(self):
-        """Connect to reserve.db database and sanitize input."""
-        self.conn = sqlite3.connect("./Raw_Data/reserve.db")
-        self.cursor = self.conn.cursor()
-        raw_data = self.cursor.execute("""select reid,
-        ruid, clid, total_cost, payment, guests from reserve;""").fetchall()
-        raw_data: List[ReserveTableData] = list(
-            map(lambda x: ReserveTableData(x[0], x[1], x[2], x[3], x[4], x[5]),
-                raw_data))
-        self.cleanData = self.sanitizeData(raw_data)
-
-    def __del__(self):
-        """Disconnect from reserve.db sqlite database."""
-        self.conn.close()
-
-    def sanitizeData(
-            self, raw_data: List[ReserveTableData]) -> List[ReserveTableData]:
-        """Remove invalid (dirty) data for insertion into the database."""
-        return list(
-            filter(
-                lambda x: x.reid is not None and x.ruid is not None and x.clid
-                is not None and x.total_cost is not None and x.payment is
-                not None and x.payment != "" and x.guests is not None and x.
-                guests >= 1, raw_data))
-
-    def getCleanData(self) -> List[ReserveTableData]:
+    TABLE = "Reserve"
+    SCHEMA = (("reid", int), ("ruid", int), ("clid", int),
+              ("total_cost", float), ("payment", str), ("guests", int))
+    PRIMARY_KEY = "reid"
+    ADD_PRIMARY_KEY = True
+    RECORD = ReserveTableData
+    SANITIZE_RULES = (NonEmpty("payment"), AtLeast("guests", 1))
+    SOURCE = "./Raw_Data/reserve.db"
+    QUERY = """select reid, ruid, clid,
+            total_cost, payment, guests from reserve"""
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Connect to reserve.db database and read the reserve table."""
+        return readSqliteColumns(cls)
+
+    @classmethod
+    def readSource(cls) -> Tuple[Columns, Dict[str, int]]:
+        """Read the reserve table and count the rows sqlite left out."""
+        return readSqliteColumns(cls), countSqliteRejected(cls)
+
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Fetch the reserve table in columns of at most chunkSize rows."""
+        yield from iterSqliteColumns(cls, chunkSize)
+
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[ReserveTableData], RecordBatch]:
         """Get sanitized records from records.db sqlite database."""
-        return self.cleanData
-
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Reserve table.
-
-        Alters Reserve table by adding primary key constraint to reid.
-        Reset sequence to max after all data has been inserted.
-        """
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO RESERVE (reid, ruid, clid,
-                total_cost, payment, guests)
-                VALUES (%s,%s,%s,%s,%s,%s)""",
-                (record.reid, record.ruid, record.clid, record.total_cost,
-                 record.payment, record.guests))
-        conn.cursor.execute("""ALTER TABLE reserve ADD PRIMARY KEY (reid);""")
-        conn.conn.commit()
-        conn.cursor.execute("select max(reid) from reserve;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE reserve_reid_seq
-        restart with %s;""", (max, ))
-        conn.conn.commit()
+        return super().getCleanData(asBatch)
 
 
 class RoomTableData:
@@ -130,53 +709,52 @@ class RoomTableData:
         return f"{self.rid}-{self.hid}-{self.rdid}-{self.rprice}"
 
 
-class RoomTableRawData:
+class RoomTableRawData(TableRawData):
     """Class to connect to rooms.db sqlite database and sanitize records."""
 
-    def __init__(self):
-        """Connect to rooms.db database and sanitize input."""
-        self.conn = sqlite3.connect("./Raw_Data/rooms.db")
-        self.cursor = self.conn.cursor()
-        raw_data = self.cursor.execute("""
-        select rid, hid, rdid, rprice from Room;""").fetchall()
-        raw_data = list(
-            map(lambda x: RoomTableData(x[0], x[1], x[2], x[3]), raw_data))
-        self.cleanData = self.sanitizeData(raw_data)
-
-    def __del__(self):
-        """Disconnect from rooms.db sqlite database."""
-        self.conn.close()
-
-    def sanitizeData(self, raw_data: List[RoomTableData]):
-        """Remove invalid (dirty) data for insertion into the database."""
-        return list(
-            filter(
-                lambda x: x.rid is not None and x.hid is not None and x.rdid is
-                not None and x.rprice is not None and x.rprice > 0, raw_data))
-
-    def insertSanitizedRecords(self, conn: DatabaseConnection):
+    TABLE = "Room"
+    SCHEMA = (("rid", int), ("hid", int), ("rdid", int), ("rprice", float))
+    PRIMARY_KEY = "rid"
+    ADD_PRIMARY_KEY = True
+    RECORD = RoomTableData
+    SANITIZE_RULES = (GreaterThan("rprice", 0), )
+    SOURCE = "./Raw_Data/rooms.db"
+    QUERY = """
+            select rid, hid, rdid, rprice from Room"""
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Connect to rooms.db database and read the Room table."""
+        return readSqliteColumns(cls)
+
+    @classmethod
+    def readSource(cls) -> Tuple[Columns, Dict[str, int]]:
+        """Read the Room table and count the rows sqlite left out."""
+        return readSqliteColumns(cls), countSqliteRejected(cls)
+
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Fetch the Room table in columns of at most chunkSize rows."""
+        yield from iterSqliteColumns(cls, chunkSize)
+
+    def insertSanitizedRecords(self,
+                               conn: DatabaseSession,
+                               method: str = COPY_METHOD,
+                               finalize: bool = True) -> BulkLoadStats:
         """Insert clean data into the Room table.
 
-        Alters Reserve table by adding primary key constraint to rid.
+        Alters Room table by adding primary key constraint to rid.
         Reset sequence to max after all data has been inserted.
         """
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO Room
-                (rid, hid, rdid, rprice)
-                VALUES (%s,%s,%s,%s)""",
-                (record.rid, record.hid, record.rdid, record.rprice))
-        conn.cursor.execute("""ALTER TABLE Room ADD PRIMARY KEY (rid);""")
-        conn.conn.commit()
-        conn.cursor.execute("select max(rid) from room;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE room_rid_seq
-        restart with %s;""", (max, ))
+        return self.insertSanitizedData(conn, method, finalize)
 
-    def getCleanData(self) -> List[ReserveTableData]:
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[RoomTableData], RecordBatch]:
         """Get sanitized records from rooms.db sqlite database."""
-        return self.cleanData
+        return super().getCleanData(asBatch)
 
 
 class RoomDescriptionTableData:
@@ -206,46 +784,44 @@ class RoomDescriptionTableData:
         return f"{self.rdid}-{self.rname}-{self.rtype}-{self.capacity}-{self.ishandicap}"
 
 
-class RoomDescriptionTableRawData:
+class RoomDescriptionTableRawData(TableRawData):
     """Class to open dataframe for Room Details JSON and sanitize records."""
 
-    def __init__(self):
-        """Read JSON File and sanitize input."""
-        self.roomDescription_data = list()
+    TABLE = "RoomDescription"
+    SCHEMA = (("rdid", int), ("rname", str), ("rtype", str),
+              ("capacity", int), ("ishandicap", bool))
+    PRIMARY_KEY = "rdid"
+    RECORD = RoomDescriptionTableData
+    SOURCE = "Raw_Data/roomdetails.json"
+    SOURCE_COLUMNS = {
+        "rdid": "detailid",
+        "rname": "name",
+        "rtype": "type",
+        "capacity": "capacity",
+        "ishandicap": "handicap"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Read JSON File into columns."""
         try:
-            df = pd.read_json("Raw_Data/roomdetails.json")
-            df = df.dropna()
-            df['detailid'] = df['detailid'].astype(int)
-            for index, row in df.iterrows():
-                self.roomDescription_data.append(
-                    RoomDescriptionTableData(row['detailid'], row['name'],
-                                             row['type'], row['capacity'],
-                                             bool(row['handicap'])))
+            return readJsonColumns(cls)
         except Exception as e:
             print("Unable to read JSON", e)
-            return None
+            return emptyColumns(cls.getColumns())
 
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the RoomDescription table.
-        Reset sequence to max after all data has been inserted."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO RoomDescription
-                (rdid, rname, rtype, capacity, ishandicap)
-                VALUES (%s,%s,%s,%s,%s)""",
-                (record.rdid, record.rname, record.rtype, record.capacity,
-                 record.ishandicap))
-        conn.conn.commit()
-
-        conn.cursor.execute("select max(rdid) from roomdescription;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE roomdescription_rdid_seq
-        restart with %s;""", (max, ))
-        conn.conn.commit()
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Parse the JSON File incrementally in chunks of chunkSize rows."""
+        yield from iterJsonColumns(cls, chunkSize)
 
-    def getCleanData(self) -> List[RoomDescriptionTableData]:
-        return self.roomDescription_data
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[RoomDescriptionTableData], RecordBatch]:
+        """Get sanitized records from roomdetails.json file."""
+        return super().getCleanData(asBatch)
 
 
 class LoginTableData:
@@ -272,44 +848,43 @@ class LoginTableData:
         return f"{self.lid}-{self.eid}-{self.username}-{self.password}"
 
 
-class LoginTableRawData:
+class LoginTableRawData(TableRawData):
     """Class to open dataframe for Login XLSX and sanitize records."""
 
-    def __init__(self):
-        """Read Excel File and sanitize input."""
-        self.login_data = list()
+    TABLE = "Login"
+    SCHEMA = (("lid", int), ("eid", int), ("username", str),
+              ("password", str))
+    PRIMARY_KEY = "lid"
+    RECORD = LoginTableData
+    SOURCE = "Raw_Data/login.xlsx"
+    SOURCE_COLUMNS = {
+        "lid": "lid",
+        "eid": "employeeid",
+        "username": "user",
+        "password": "pass"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Read Excel File into columns."""
         try:
-            df = pd.read_excel("Raw_Data/login.xlsx")
-            df = df.dropna()
-            df['lid'] = df['lid'].astype(int)
-            for index, row in df.iterrows():
-                self.login_data.append(
-                    LoginTableData(row['lid'], row['employeeid'], row['user'],
-                                   row['pass']))
+            return readXlsxColumns(cls)
         except Exception as e:
             print("Unable to read XLSX", e)
-            return None
+            return emptyColumns(cls.getColumns())
 
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Login table.
-        Reset sequence to max after all data has been inserted."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO Login
-                (lid, eid, username, password)
-                VALUES (%s,%s,%s,%s)""",
-                (record.lid, record.eid, record.username, record.password))
-        conn.conn.commit()
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Read the workbook in columns of at most chunkSize rows."""
+        yield from iterXlsxColumns(cls, chunkSize)
 
-        conn.cursor.execute("select max(lid) from login;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE login_lid_seq
-        restart with %s;""", (max, ))
-        conn.conn.commit()
-
-    def getCleanData(self) -> List[LoginTableData]:
-        return self.login_data
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[LoginTableData], RecordBatch]:
+        """Get sanitized records from login.xlsx file."""
+        return super().getCleanData(asBatch)
 
 
 class ChainsTableData:
@@ -371,87 +946,87 @@ class EmployeeTableData:
         return f"{self.eid}-{self.hid}-{self.fname}-{self.lname}-{self.position}-{self.salary}"
 
 
-class EmployeeTableRawData:
+class EmployeeTableRawData(TableRawData):
     """Class to open dataframe for Employee JSON and sanitize records."""
 
-    def __init__(self):
-        """Read JSON File and sanitize input."""
-        self.employee_data = list()
+    TABLE = "Employee"
+    SCHEMA = (("eid", int), ("hid", int), ("fname", str), ("lname", str),
+              ("position", str), ("salary", float))
+    PRIMARY_KEY = "eid"
+    RECORD = EmployeeTableData
+    SOURCE = "Raw_Data/employee.json"
+    SOURCE_COLUMNS = {
+        "eid": "employee_id",
+        "hid": "hotel_id",
+        "fname": "firstname",
+        "lname": "lastname",
+        "position": "pos",
+        "salary": "salary"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Read JSON File into columns."""
         try:
-            df = pd.read_json("Raw_Data/employee.json")
-            df = df.dropna()
-            df['employee_id'] = df['employee_id'].astype(int)
-            for index, row in df.iterrows():
-                self.employee_data.append(
-                    EmployeeTableData(row['employee_id'], row['hotel_id'],
-                                      row['firstname'], row['lastname'],
-                                      row['pos'], row['salary']))
+            return readJsonColumns(cls)
         except Exception as e:
             print("Unable to read JSON", e)
-            return None
+            return emptyColumns(cls.getColumns())
 
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Employee table.
-        Reset sequence to max after all data has been inserted."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO Employee
-                (eid, hid, fname, lname, position, salary)
-                VALUES (%s,%s,%s,%s,%s,%s)""",
-                (record.eid, record.hid, record.fname, record.lname,
-                 record.position, record.salary))
-        conn.conn.commit()
-
-        conn.cursor.execute("select max(eid) from employee;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE employee_eid_seq
-        restart with %s;""", (max, ))
-        conn.conn.commit()
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Parse the JSON File incrementally in chunks of chunkSize rows."""
+        yield from iterJsonColumns(cls, chunkSize)
 
-    def getCleanData(self) -> List[EmployeeTableData]:
-        return self.employee_data
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[EmployeeTableData], RecordBatch]:
+        """Get sanitized records from employee.json file."""
+        return super().getCleanData(asBatch)
 
 
-class ChainsTableRawData:
+class ChainsTableRawData(TableRawData):
     """Class to open dataframe for Chains XLSX file and sanitize records."""
 
-    def __init__(self):
-        """Read Excel File and sanitize input."""
-        self.chains_data = list()
+    TABLE = "Chains"
+    SCHEMA = (("chid", int), ("cname", str), ("springmkup", float),
+              ("summermkup", float), ("fallmkup", float),
+              ("wintermkup", float))
+    PRIMARY_KEY = "chid"
+    RECORD = ChainsTableData
+    SOURCE = "Raw_Data/chain.xlsx"
+    SOURCE_COLUMNS = {
+        "chid": "id",
+        "cname": "name",
+        "springmkup": "spring",
+        "summermkup": "summer",
+        "fallmkup": "fall",
+        "wintermkup": "winter"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Read Excel File into columns."""
         try:
-            df = pd.read_excel("Raw_Data/chain.xlsx")
-            df = df.dropna()
-            df['id'] = df['id'].astype(int)
-            for index, row in df.iterrows():
-                self.chains_data.append(
-                    ChainsTableData(row['id'], row['name'], row['spring'],
-                                    row['summer'], row['fall'], row['winter']))
+            return readXlsxColumns(cls)
         except Exception as e:
             print("An error occurred:", e)
-            return None
-
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Chains table.
-        Reset sequence to max after all data has been inserted."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO Chains
-                (chid, cname, springmkup, summermkup, fallmkup, wintermkup)
-                VALUES (%s, %s, %s, %s, %s, %s)""",
-                (record.chid, record.cname, record.springmkup,
-                 record.summermkup, record.fallmkup, record.wintermkup))
-        conn.conn.commit()
+            return emptyColumns(cls.getColumns())
 
-        conn.cursor.execute("select max(chid) from chains;")
-        max = int(conn.cursor.fetchone()[0]) + 1
-        conn.cursor.execute(
-            """ALTER SEQUENCE chains_chid_seq
-        restart with %s;""", (max, ))
-        conn.conn.commit()
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Read the workbook in columns of at most chunkSize rows."""
+        yield from iterXlsxColumns(cls, chunkSize)
 
-    def getCleanData(self) -> List[ChainsTableData]:
-        return self.chains_data
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[ChainsTableData], RecordBatch]:
+        """Get sanitized records from chain.xlsx file."""
+        return super().getCleanData(asBatch)
 
 
 class ClientTableData:
@@ -482,43 +1057,46 @@ class ClientTableData:
         return s
 
 
-class ClientTableRawData:
+class ClientTableRawData(TableRawData):
     """Accesses the clients.csv file, sanitizes and inserts the entries."""
 
-    def __init__(self):
-        """Access the clients.csv file and sanitizes the input."""
-        df = pd.read_csv('./Raw_Data/client.csv')
-        df = df.dropna()
-        raw_data = list()
-        for index, row in df.iterrows():
-            raw_data.append(
-                ClientTableData(row['clid'], row[' fname'], row[' lastname'],
-                                row[' age'], row[' memberyear']))
-        self.cleanData = self.sanitizeData(raw_data)
-
-    def sanitizeData(self,
-                     raw_data: List[ClientTableData]) -> List[ClientTableData]:
-        """Remove invalid (dirty) data for insertion into the database."""
-        return list(
-            # Filters out null values
-            filter(
-                lambda x: x.clid is not None and x.fname is not None and x.
-                lname is not None and x.age is not None and x.memberyear is
-                not None, raw_data))
-
-    def getCleanData(self) -> List[ClientTableData]:
+    TABLE = "Client"
+    SCHEMA = (("clid", int), ("fname", str), ("lname", str), ("age", int),
+              ("memberyear", int))
+    PRIMARY_KEY = "clid"
+    RECORD = ClientTableData
+    SOURCE = "./Raw_Data/client.csv"
+    SOURCE_COLUMNS = {
+        "clid": "clid",
+        "fname": " fname",
+        "lname": " lastname",
+        "age": " age",
+        "memberyear": " memberyear"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Access the clients.csv file and read it into columns."""
+        return readCsvColumns(cls)
+
+    @classmethod
+    def readNewColumns(cls, offset: int = 0) -> Columns:
+        """Read the rows appended after offset."""
+        return readCsvColumns(cls, offset)
+
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Read the csv file in columns of at most chunkSize rows."""
+        for df in pd.read_csv(cls.SOURCE, chunksize=chunkSize):
+            yield cls.frameColumns(df)
+
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[ClientTableData], RecordBatch]:
         """Get sanitized records from clients.csv file."""
-        return self.cleanData
-
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Client table."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO CLIENT (clid, fname, lname, age, memberyear)
-                VALUES(%s, %s, %s, %s, %s)""",
-                (record.clid, record.fname, record.lname, record.age,
-                 record.memberyear))
-            conn.conn.commit()
+        return super().getCleanData(asBatch)
 
 
 class HotelTableData:
@@ -544,41 +1122,44 @@ class HotelTableData:
         return s
 
 
-class HotelTableRawData:
+class HotelTableRawData(TableRawData):
     """Class accesses the hotel.csv file, sanitizes and inserts the entries."""
 
-    def __init__(self):
-        """Access the clients.csv file and sanitizes the input."""
-        df = pd.read_csv('./Raw_Data/hotel.csv')
-        df = df.dropna()
-        raw_data = list()
-        for index, row in df.iterrows():
-            raw_data.append(
-                HotelTableData(row['hid'], row['chain'], row['name'],
-                               row['city']))
-        self.cleanData = self.sanitizeData(raw_data)
-
-    def sanitizeData(self,
-                     raw_data: List[HotelTableData]) -> List[HotelTableData]:
-        """Remove invalid (dirty) data for insertion into the database."""
-        return list(
-            # Filters out null values
-            filter(
-                lambda x: x.hid is not None and x.chid is not None and x.hname
-                is not None and x.hcity is not None, raw_data))
-
-    def getCleanData(self) -> List[HotelTableData]:
+    TABLE = "Hotel"
+    SCHEMA = (("hid", int), ("chid", int), ("hname", str), ("hcity", str))
+    PRIMARY_KEY = "hid"
+    RECORD = HotelTableData
+    SOURCE = "./Raw_Data/hotel.csv"
+    SOURCE_COLUMNS = {
+        "hid": "hid",
+        "chid": "chain",
+        "hname": "name",
+        "hcity": "city"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Access the hotel.csv file and read it into columns."""
+        return readCsvColumns(cls)
+
+    @classmethod
+    def readNewColumns(cls, offset: int = 0) -> Columns:
+        """Read the rows appended after offset."""
+        return readCsvColumns(cls, offset)
+
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Read the csv file in columns of at most chunkSize rows."""
+        for df in pd.read_csv(cls.SOURCE, chunksize=chunkSize):
+            yield cls.frameColumns(df)
+
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[HotelTableData], RecordBatch]:
         """Get sanitized records from hotel.csv file."""
-        return self.cleanData
-
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the Hotel table."""
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO HOTEL (hid, chid, hname, hcity)
-                VALUES(%s, %s, %s, %s)""",
-                (record.hid, record.chid, record.hname, record.hcity))
-            conn.conn.commit()
+        return super().getCleanData(asBatch)
 
 
 class RoomUnavailableTableData:
@@ -604,63 +1185,68 @@ class RoomUnavailableTableData:
         return s
 
 
-class RoomUnavailableTableRawData:
+class RoomUnavailableTableRawData(TableRawData):
     """Accesses room_unavailable.csv file, sanitize and inserts the entries."""
 
-    def __init__(self):
-        """Access the room_unavaible.csv file and sanitizes the input."""
-        df = pd.read_csv('./Raw_Data/room_unavailable.csv')
-        df = df.dropna()
-        raw_data = list()
-        for index, row in df.iterrows():
-            raw_data.append(
-                RoomUnavailableTableData(row['ruid'], row['rid'],
-                                         row['start_date'], row['end_date']))
-        self.cleanData = self.sanitizeData(raw_data)
-
-    def sanitizeData(
-        self, raw_data: List[RoomUnavailableTableData]
-    ) -> List[RoomUnavailableTableData]:
-        """Remove invalid (dirty) data for insertion into the database."""
-        return list(
-            # Filters out null values
-            filter(
-                lambda x: x.ruid is not None and x.rid is not None and x.
-                startdate is not None and x.enddate is not None, raw_data))
-
-    def getCleanData(self) -> List[RoomUnavailableTableData]:
+    TABLE = "RoomUnavailable"
+    SCHEMA = (("ruid", int), ("rid", int), ("startdate", date),
+              ("enddate", date))
+    PRIMARY_KEY = "ruid"
+    RECORD = RoomUnavailableTableData
+    # Malformed dates are rejected by NotNull, inverted ranges by NotBefore.
+    SANITIZE_RULES = (NotBefore("enddate", "startdate"), )
+    SOURCE = "./Raw_Data/room_unavailable.csv"
+    DATE_FORMAT = "%m/%d/%Y"
+    SOURCE_COLUMNS = {
+        "ruid": "ruid",
+        "rid": "rid",
+        "startdate": "start_date",
+        "enddate": "end_date"
+    }
+
+    @classmethod
+    def readColumns(cls) -> Columns:
+        """Access the room_unavaible.csv file and read it into columns."""
+        return readCsvColumns(cls)
+
+    @classmethod
+    def readNewColumns(cls, offset: int = 0) -> Columns:
+        """Read the rows appended after offset."""
+        return readCsvColumns(cls, offset)
+
+    @classmethod
+    def iterColumns(
+            cls,
+            chunkSize: int = TableRawData.CHUNK_SIZE) -> Iterator[Columns]:
+        """Read the csv file in columns of at most chunkSize rows."""
+        for df in pd.read_csv(cls.SOURCE, chunksize=chunkSize):
+            yield cls.frameColumns(df)
+
+    def getCleanData(
+            self,
+            asBatch: bool = False) -> Union[List[RoomUnavailableTableData], RecordBatch]:
         """Get sanitized records from room_unavailable.csv file."""
-        return self.cleanData
-
-    def insertSanitizedData(self, conn: DatabaseConnection):
-        """Insert clean data into the RoomUnavailable table."""
-
-        for record in self.getCleanData():
-            conn.cursor.execute(
-                """INSERT INTO ROOMUNAVAILABLE (ruid, rid, startdate, enddate)
-                VALUES(%s, %s, %s, %s)""",
-                (record.ruid, record.rid, record.startdate, record.enddate))
-            conn.conn.commit()
+        return super().getCleanData(asBatch)
 
 
 if __name__ == "__main__":
-    conn = DatabaseConnection("db", "uwu", "uwu", "127.0.0.1", "5432")
-    loginData = LoginTableRawData()
-    loginData.insertSanitizedData(conn)
-    employeeData = EmployeeTableRawData()
-    employeeData.insertSanitizedData(conn)
-    hotelData = HotelTableRawData()
-    hotelData.insertSanitizedData(conn)
-    chainsData = ChainsTableRawData()
-    chainsData.insertSanitizedData(conn)
-    roomDescriptionData = RoomDescriptionTableRawData()
-    roomDescriptionData.insertSanitizedData(conn)
-    clientData = ClientTableRawData()
-    clientData.insertSanitizedData(conn)
-    roomData = RoomTableRawData()
-    roomData.insertSanitizedRecords(conn)
-    reserveData = ReserveTableRawData()
-    reserveData.insertSanitizedData(conn)
-    roomUnavailableData = RoomUnavailableTableRawData()
-    roomUnavailableData.insertSanitizedData(conn)
-    conn.addForeignKeyConstraints()
+    import os
+
+    from instrumentation import Instrumentation
+    from load_orchestrator import LoadOrchestrator
+    from referential_integrity import QUARANTINE, ReferentialValidator
+    from source_cache import SourceCache
+
+    metrics = Instrumentation()
+    with DatabaseConnection("db",
+                            "uwu",
+                            "uwu",
+                            "127.0.0.1",
+                            "5432",
+                            instrumentation=metrics) as database:
+        LoadOrchestrator(database,
+                         parseProcesses=os.cpu_count(),
+                         cache=SourceCache(),
+                         validator=ReferentialValidator(
+                             QUARANTINE, "quarantine")).run()
+    metrics.writeJson("load_metrics.json")
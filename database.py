@@ -3,138 +3,712 @@
 This module was developed for the term project - Hotel Analytics Systems for
 CIIC4060/ICOM 5016.
 """
+import re
+import threading
+import time
+from contextlib import contextmanager
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from functools import partial
+from typing import Dict, Iterator, List, Optional, Sequence, Tuple
+
+import numpy as np
 import psycopg2
+import psycopg2.errors
+from psycopg2.extensions import (TRANSACTION_STATUS_IDLE,
+                                 TRANSACTION_STATUS_UNKNOWN, connection)
+
+from instrumentation import Instrumentation, StageMetrics, TimedCursor
+from result_cache import ResultCache
+
+# Foreign keys as (table, column, referenced table, referenced column). The
+# loaders use this list to know which tables depend on each other.
+FOREIGN_KEYS = (
+    ("Login", "eid", "Employee", "eid"),
+    ("Employee", "hid", "Hotel", "hid"),
+    ("Hotel", "chid", "Chains", "chid"),
+    ("Reserve", "ruid", "RoomUnavailable", "ruid"),
+    ("Reserve", "clid", "Client", "clid"),
+    ("RoomUnavailable", "rid", "Room", "rid"),
+    ("Room", "hid", "Hotel", "hid"),
+    ("Room", "rdid", "RoomDescription", "rdid"),
+)
+
+# Column definitions of every table. Foreign keys are not declared with the
+# tables, they are added NOT VALID by addForeignKeyConstraints after loading.
+TABLE_COLUMNS = {
+    "Chains": """chid SERIAL PRIMARY KEY, cname VARCHAR NOT NULL,
+    springmkup FLOAT NOT NULL, summermkup FLOAT NOT NULL,
+    fallmkup FLOAT NOT NULL, wintermkup FLOAT NOT NULL""",
+    "Hotel": """hid SERIAL PRIMARY KEY, chid INTEGER NOT NULL,
+    hname VARCHAR NOT NULL, hcity VARCHAR NOT NULL""",
+    "Employee": """eid SERIAL PRIMARY KEY, hid INTEGER NOT NULL,
+    fname VARCHAR NOT NULL, lname VARCHAR NOT NULL,
+    position VARCHAR NOT NULL, salary FLOAT NOT NULL""",
+    "Login": """lid SERIAL PRIMARY KEY, eid INTEGER NOT NULL,
+    username VARCHAR NOT NULL, password VARCHAR NOT NULL""",
+    "RoomDescription": """rdid SERIAL PRIMARY KEY, rname VARCHAR NOT NULL,
+    rtype VARCHAR NOT NULL, capacity INTEGER NOT NULL,
+    ishandicap BOOLEAN NOT NULL""",
+    "Room": """rid SERIAL PRIMARY KEY, hid INTEGER NOT NULL,
+    rdid INTEGER NOT NULL, rprice REAL NOT NULL""",
+    "RoomUnavailable": """ruid SERIAL PRIMARY KEY, rid INTEGER NOT NULL,
+    startdate DATE NOT NULL, enddate DATE NOT NULL""",
+    "Client": """clid SERIAL PRIMARY KEY, fname VARCHAR NOT NULL,
+    lname VARCHAR NOT NULL, age INTEGER NOT NULL,
+    memberyear INTEGER NOT NULL""",
+    "Reserve": """reid SERIAL PRIMARY KEY, ruid INTEGER NOT NULL,
+    clid INTEGER NOT NULL, total_cost REAL NOT NULL, payment TEXT,
+    guests INTEGER NOT NULL""",
+    # Size and fingerprint of the source file of every table, kept for
+    # incremental loads.
+    "LoadState": """tname VARCHAR PRIMARY KEY, source VARCHAR NOT NULL,
+    size BIGINT NOT NULL, fingerprint VARCHAR NOT NULL,
+    loaded TIMESTAMP NOT NULL DEFAULT now()""",
+}
+
+# Tables that can be range partitioned as table: (column, interval), the
+# interval being a key of PARTITION_INTERVALS. Partitioned tables are only
+# created by DatabaseConnection(partitioned=True) on a database without
+# them, their primary key includes the partition column.
+PARTITIONED_TABLES = {"RoomUnavailable": ("startdate", "year")}
+PARTITIONED_COLUMNS = {
+    "RoomUnavailable": """ruid SERIAL, rid INTEGER NOT NULL,
+    startdate DATE NOT NULL, enddate DATE NOT NULL,
+    PRIMARY KEY (ruid, startdate)""",
+}
+# Partition intervals as (NumPy unit of their start, partition name format).
+PARTITION_INTERVALS = {
+    "month": ("datetime64[M]", "%Y_%m"),
+    "year": ("datetime64[Y]", "%Y"),
+}
+# Schema detached partitions are moved to when they are archived.
+ARCHIVE_SCHEMA = "archive"
+# Range bound of a partition as shown by pg_get_expr.
+PARTITION_BOUND = re.compile(r"FROM \('([\d-]+)'\) TO \('([\d-]+)'\)")
+
+# Materialized views of the top-N dashboard queries as (query, key columns).
+# The key columns get the unique index REFRESH ... CONCURRENTLY needs.
+MATERIALIZED_VIEWS = {
+    "RoomReservations": ("""SELECT ru.rid, count(*) AS reservations,
+    sum(r.total_cost) AS revenue
+    FROM Reserve r JOIN RoomUnavailable ru ON ru.ruid = r.ruid
+    GROUP BY ru.rid""", "rid"),
+    "HotelRevenue": ("""SELECT h.hid, h.hname, h.hcity,
+    count(r.reid) AS reservations, coalesce(sum(r.total_cost), 0) AS revenue
+    FROM Hotel h LEFT JOIN Room rm ON rm.hid = h.hid
+    LEFT JOIN RoomUnavailable ru ON ru.rid = rm.rid
+    LEFT JOIN Reserve r ON r.ruid = ru.ruid
+    GROUP BY h.hid""", "hid"),
+    "ClientReservations": ("""SELECT c.clid, c.fname, c.lname, c.memberyear,
+    count(r.reid) AS reservations, coalesce(sum(r.total_cost), 0) AS spent
+    FROM Client c LEFT JOIN Reserve r ON r.clid = c.clid
+    GROUP BY c.clid""", "clid"),
+    "PaymentMix": ("""SELECT coalesce(payment, '') AS payment,
+    count(*) AS reservations, sum(total_cost) AS revenue,
+    count(*)::FLOAT / sum(count(*)) OVER () AS share
+    FROM Reserve GROUP BY 1""", "payment"),
+}
+
+# Secondary indexes as name: (table, method, columns). They are dropped
+# before a bulk load and built once every table is loaded, so the inserts
+# don't maintain them.
+SECONDARY_INDEXES = {
+    "Login_eid_idx": ("Login", "btree", "eid"),
+    "Employee_hid_idx": ("Employee", "btree", "hid"),
+    "Hotel_chid_idx": ("Hotel", "btree", "chid"),
+    "Room_hid_idx": ("Room", "btree", "hid"),
+    "Room_rdid_idx": ("Room", "btree", "rdid"),
+    # Also serves the lookups by rid alone, like the joins to Room.
+    "RoomUnavailable_rid_dates_idx": ("RoomUnavailable", "btree",
+                                      "rid, startdate, enddate"),
+    "RoomUnavailable_dates_idx": ("RoomUnavailable", "btree",
+                                  "startdate, enddate"),
+    "Reserve_ruid_idx": ("Reserve", "btree", "ruid"),
+    "Reserve_clid_idx": ("Reserve", "btree", "clid"),
+}
+
+# Version of the schema created by schemaDdl, bump it whenever the schema
+# changes so existing databases apply it again.
+SCHEMA_VERSION = 4
+# Key of the advisory lock serializing concurrent schema bootstraps.
+SCHEMA_LOCK = 5016
+
+
+def schemaDdl(partitioned: bool = False) -> str:
+    """Return the statements creating the whole schema, in a single string.
+
+    Tables are created without foreign keys so they can be loaded in any
+    order, tables that already exist are left as they are. The loaders add
+    the missing primary and foreign keys after loading them.
 
+    :param partitioned Create the PARTITIONED_TABLES partitioned by range,
+    without partitions.
+    """
+    statements = [
+        f"SELECT pg_advisory_xact_lock({SCHEMA_LOCK});",
+        """CREATE TABLE IF NOT EXISTS SchemaVersion (
+    version INTEGER PRIMARY KEY,
+    applied TIMESTAMP NOT NULL DEFAULT now());"""
+    ]
+    partitions = PARTITIONED_TABLES if partitioned else {}
+    for table, columns in TABLE_COLUMNS.items():
+        if table in partitions:
+            columns = PARTITIONED_COLUMNS[table]
+        partitionBy = (f" PARTITION BY RANGE ({partitions[table][0]})"
+                       if table in partitions else "")
+        statements.append(f"CREATE TABLE IF NOT EXISTS {table} (\n    "
+                          f"{columns}){partitionBy};")
+    for view, (query, key) in MATERIALIZED_VIEWS.items():
+        statements.append(f"""CREATE MATERIALIZED VIEW IF NOT EXISTS {view} AS
+    {query}
+    WITH NO DATA;
+CREATE UNIQUE INDEX IF NOT EXISTS {view}_key ON {view} ({key});""")
+    statements.append(f"""INSERT INTO SchemaVersion (version)
+    VALUES ({SCHEMA_VERSION}) ON CONFLICT DO NOTHING;""")
+    return "\n".join(statements)
 
-class DatabaseConnection:
-    """Create database tables and connect to database."""
 
-    def __init__(self, DB_NAME: str, DB_USER: str, DB_PASS: str, DB_HOST: str,
-                 DB_PORT: str):
-        """Create DatabaseConnection object and tables if they do not exist."""
-        with psycopg2.connect(database=DB_NAME,
-                              user=DB_USER,
-                              password=DB_PASS,
-                              host=DB_HOST,
-                              port=DB_PORT) as conn:
-            self.conn = conn
+def partitionStarts(dates: np.ndarray, interval: str) -> np.ndarray:
+    """Get the sorted first day of every partition holding one of dates."""
+    unit = PARTITION_INTERVALS[interval][0]
+    return np.unique(np.asarray(dates, dtype="datetime64[D]").astype(unit))
+
+
+def partitionName(table: str, start: np.datetime64, interval: str) -> str:
+    """Get the name of the partition of table starting at start."""
+    day = start.astype("datetime64[D]").item()
+    return f"{table}_p{day.strftime(PARTITION_INTERVALS[interval][1])}"
+
+
+def isBroken(conn: connection) -> bool:
+    """Check if conn is closed or lost its connection to the server."""
+    return bool(conn.closed) or (conn.get_transaction_status()
+                                 == TRANSACTION_STATUS_UNKNOWN)
+
+
+class DatabaseSession:
+    """Database connection with its own cursor.
+
+    Sessions are handed out by DatabaseConnection.session and can be passed
+    to the loaders wherever a DatabaseConnection is expected.
+    """
+
+    def __init__(self,
+                 conn: connection,
+                 instrumentation: Optional[Instrumentation] = None):
+        """Construct DatabaseSession.
+
+        :param conn psycopg2 connection used only by this session.
+        :param instrumentation Records every statement run by the cursor of
+        the session when given.
+        """
+        self.conn = conn
+        if instrumentation is None:
             self.cursor = conn.cursor()
-            self.createRoomTable()
-            self.createReserveTable()
-            self.createLoginTable()
-            self.createChainsTable()
-            self.createClientTable()
-            self.createHotelTable()
-            self.createRoomUnavailableTable()
-            self.createEmployeeTable()
-            self.createRoomDescriptionTable()
-
-    def createRoomTable(self):
-        """Create Room table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS Room (rid SERIAL,
-                hid INTEGER NOT NULL, rdid INTEGER NOT NULL,
-                rprice REAL NOT NULL);""")
-        self.conn.commit()
+        else:
+            self.cursor = conn.cursor(cursor_factory=TimedCursor)
+            self.cursor.instrumentation = instrumentation
 
-    def createRoomDescriptionTable(self):
-        """Create RoomDescription table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS RoomDescription (
-            rdid SERIAL PRIMARY KEY,
-            rname VARCHAR NOT NULL,
-            rtype VARCHAR NOT NULL,
-            capacity INTEGER NOT NULL,
-            ishandicap BOOLEAN NOT NULL);""")
-        self.conn.commit()
+    def hasPrimaryKey(self, table: str) -> bool:
+        """Check if table already has a primary key constraint."""
+        self.cursor.execute(
+            """SELECT 1 FROM pg_constraint
+            WHERE conrelid = %s::regclass AND contype = 'p';""",
+            (table.lower(), ))
+        return self.cursor.fetchone() is not None
 
-    def createReserveTable(self):
-        """Create Reserve table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS Reserve (reid SERIAL,
-            ruid INTEGER NOT NULL,
-            clid INTEGER NOT NULL,
-            total_cost REAL NOT NULL,
-            payment TEXT,
-            guests INTEGER NOT NULL);""")
-        self.conn.commit()
+    def hasForeignKey(self, table: str, column: str) -> bool:
+        """Check if column of table already references another table."""
+        self.cursor.execute(
+            """SELECT 1 FROM pg_constraint c JOIN pg_attribute a
+            ON a.attrelid = c.conrelid AND a.attnum = ANY (c.conkey)
+            WHERE c.conrelid = %s::regclass AND c.contype = 'f'
+            AND a.attname = %s;""", (table.lower(), column.lower()))
+        return self.cursor.fetchone() is not None
 
-    def createLoginTable(self):
-        """Create Login table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS Login (
-            lid SERIAL PRIMARY KEY,
-            eid INTEGER NOT NULL,
-            username VARCHAR NOT NULL,
-            password VARCHAR NOT NULL);""")
-        self.conn.commit()
+    def addForeignKeyConstraints(self):
+        """Add foreign key constraints to all tables, then validate them.
 
-    def createEmployeeTable(self):
-        """Create Employee table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS Employee (
-            eid SERIAL PRIMARY KEY,
-            hid INTEGER NOT NULL,
-            fname VARCHAR NOT NULL,
-            lname VARCHAR NOT NULL,
-            position VARCHAR NOT NULL,
-            salary FLOAT NOT NULL);""")
+        Missing constraints are added NOT VALID, which doesn't check the
+        rows already in the table, and validated afterwards under a lock
+        that doesn't block reads or writes. Partitioned tables can't hold
+        NOT VALID constraints, theirs are checked as they are added.
+        Constraints added by a previous load are left as they are, as are
+        the foreign keys referencing a partitioned table, which can't be
+        declared.
+        """
+        for child, column, parent, parentColumn in FOREIGN_KEYS:
+            # Partitioned tables have no unique key on parentColumn alone.
+            if self.hasForeignKey(child, column) or self.isPartitioned(parent):
+                continue
+            notValid = "" if self.isPartitioned(child) else "NOT VALID"
+            self.cursor.execute(f"""ALTER TABLE {child} ADD
+            FOREIGN KEY ({column}) REFERENCES {parent} ({parentColumn})
+            {notValid};""")
         self.conn.commit()
+        self.validateForeignKeyConstraints()
+
+    def dropForeignKeyConstraints(self):
+        """Drop the foreign keys of every table, before bulk loading them.
 
-    def createChainsTable(self):
-        """Create Chains table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS Chains (
-            chid SERIAL PRIMARY KEY,
-            cname VARCHAR NOT NULL,
-            springmkup float NOT NULL,
-            summermkup float NOT NULL,
-            fallmkup float NOT NULL,
-            wintermkup float NOT NULL);""")
+        Tables can then be loaded in any order and at the same time,
+        addForeignKeyConstraints adds the constraints back afterwards.
+        """
+        tables = sorted({child.lower() for child, _, _, _ in FOREIGN_KEYS})
+        self.cursor.execute(
+            """SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE contype = 'f' AND conrelid = ANY (%s::regclass[]);""",
+            (tables, ))
+        for table, constraint in self.cursor.fetchall():
+            self.cursor.execute(
+                f"ALTER TABLE {table} DROP CONSTRAINT {constraint};")
         self.conn.commit()
 
-    def __del__(self):
-        """Close database connection when object is destroyed."""
-        self.conn.close()
+    def validateForeignKeyConstraints(self):
+        """Validate the foreign keys of every table added NOT VALID.
 
-    def createClientTable(self):
-        """Create Client table if it does not already exist."""
+        Every constraint is validated and committed on its own, a constraint
+        failing validation raises and keeps the ones validated before it.
+        """
+        tables = sorted({child.lower() for child, _, _, _ in FOREIGN_KEYS})
         self.cursor.execute(
-            """CREATE TABLE IF NOT EXISTS Client (clid SERIAL PRIMARY KEY,
-       fname VARCHAR NOT NULL,lname VARCHAR NOT NULL,
-       age INTEGER NOT NULL,memberyear INTEGER NOT NULL);""")
-        self.conn.commit()
+            """SELECT conrelid::regclass::text, conname FROM pg_constraint
+            WHERE contype = 'f' AND NOT convalidated
+            AND conrelid = ANY (%s::regclass[]);""", (tables, ))
+        for table, constraint in self.cursor.fetchall():
+            self.cursor.execute(
+                f"ALTER TABLE {table} VALIDATE CONSTRAINT {constraint};")
+            self.conn.commit()
+
+    def isPartitioned(self, table: str) -> bool:
+        """Check if table is partitioned."""
+        self.cursor.execute(
+            """SELECT 1 FROM pg_partitioned_table
+            WHERE partrelid = to_regclass(%s);""", (table.lower(), ))
+        return self.cursor.fetchone() is not None
 
-    def createHotelTable(self):
-        """Create Hotel table if it does not already exist."""
+    def createPartitions(self, table: str, dates: np.ndarray) -> List[str]:
+        """Create the missing partitions of table holding any of dates.
+
+        Partitions are created in the current transaction, a detached
+        partition still named like a missing one makes it fail. Returns the
+        names of the partitions holding dates, by increasing start.
+        """
+        _, interval = PARTITIONED_TABLES[table]
+        existing = {name for name, _, _ in self.getPartitions(table)}
+        names = []
+        for start in partitionStarts(dates, interval):
+            name = partitionName(table, start, interval)
+            names.append(name)
+            if name.lower() in existing:
+                continue
+            # Adds one interval, the unit of start.
+            end = start + 1
+            self.cursor.execute(
+                f"""CREATE TABLE {name} PARTITION OF {table}
+                FOR VALUES FROM (%s) TO (%s);""",
+                (str(start.astype("datetime64[D]")),
+                 str(end.astype("datetime64[D]"))))
+        return names
+
+    def getPartitions(self, table: str) -> List[Tuple[str, date, date]]:
+        """Get the name, first day and end of every partition of table.
+
+        The end is the first day of the next partition.
+        """
         self.cursor.execute(
-            """CREATE TABLE IF NOT EXISTS Hotel (hid SERIAL PRIMARY KEY,
-            chid INTEGER NOT NULL,
-            hname VARCHAR NOT NULL,hcity VARCHAR NOT NULL);""")
+            """SELECT c.relname,
+            pg_get_expr(c.relpartbound, c.oid) FROM pg_inherits i
+            JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = %s::regclass;""", (table.lower(), ))
+        partitions = []
+        for name, bound in self.cursor.fetchall():
+            match = PARTITION_BOUND.search(bound)
+            if match is not None:
+                partitions.append((name, date.fromisoformat(match[1]),
+                                   date.fromisoformat(match[2])))
+        return sorted(partitions, key=lambda partition: partition[1])
+
+    def detachPartitions(self,
+                         table: str,
+                         before: date,
+                         archive: bool = False) -> List[str]:
+        """Detach the partitions of table ending on or before before.
+
+        Detaching only changes the catalog, the rows stay in the detached
+        tables. Rows of other tables referencing them, like the reservations
+        of archived dates, are left as they are.
+
+        :param archive Move the detached partitions to ARCHIVE_SCHEMA,
+        otherwise they are left next to table.
+
+        Returns the names of the detached partitions.
+        """
+        detached = []
+        for name, _, end in self.getPartitions(table):
+            if end > before:
+                continue
+            self.cursor.execute(
+                f"ALTER TABLE {table} DETACH PARTITION {name};")
+            if archive:
+                self.cursor.execute(
+                    f"CREATE SCHEMA IF NOT EXISTS {ARCHIVE_SCHEMA};")
+                self.cursor.execute(
+                    f"ALTER TABLE {name} SET SCHEMA {ARCHIVE_SCHEMA};")
+            detached.append(name)
         self.conn.commit()
+        return detached
 
-    def createRoomUnavailableTable(self):
-        """Create RoomUnavailable table if it does not already exist."""
-        self.cursor.execute("""CREATE TABLE IF NOT EXISTS RoomUnavailable
-            (ruid SERIAL PRIMARY KEY,
-            rid INTEGER NOT NULL,startdate
-            DATE NOT NULL,enddate DATE NOT NULL);""")
+    def dropSecondaryIndexes(self):
+        """Drop every secondary index, before bulk loading the tables."""
+        self.cursor.execute("DROP INDEX IF EXISTS " +
+                            ", ".join(SECONDARY_INDEXES) + ";")
         self.conn.commit()
 
-    def addForeignKeyConstraints(self):
-        """Add foreign key constraints to all tables."""
+    def createSecondaryIndex(self, index: str, memory: Optional[str] = None):
+        """Build a secondary index unless it already exists.
+
+        :param index Name of the index in SECONDARY_INDEXES.
+        :param memory maintenance_work_mem of the build, like '256MB', the
+        server setting when omitted.
+        """
+        table, method, columns = SECONDARY_INDEXES[index]
+        if memory is not None:
+            self.cursor.execute("SET LOCAL maintenance_work_mem = %s;",
+                                (memory, ))
+        self.cursor.execute(f"""CREATE INDEX IF NOT EXISTS {index}
+        ON {table} USING {method} ({columns});""")
+        self.conn.commit()
+
+    def refreshMaterializedView(self, view: str):
+        """Refresh a materialized view with the current table contents.
+
+        Populated views are refreshed concurrently, so readers keep seeing
+        the previous contents until the refresh commits.
+        """
+        self.cursor.execute(
+            "SELECT relispopulated FROM pg_class WHERE oid = %s::regclass;",
+            (view.lower(), ))
+        concurrently = "CONCURRENTLY " if self.cursor.fetchone()[0] else ""
         self.cursor.execute(
-            """alter table LOGIN add foreign key
-            (EID) references EMPLOYEE (EID);"""
-        )
-        self.cursor.execute("""ALTER TABLE EMPLOYEE ADD
-        FOREIGN KEY (HID) REFERENCES HOTEL (HID);""")
-        self.cursor.execute("""ALTER TABLE HOTEL ADD FOREIGN KEY (CHID)
-        REFERENCES CHAINS (CHID);""")
-        self.cursor.execute("""ALTER TABLE RESERVE ADD FOREIGN KEY (RUID)
-        REFERENCES ROOMUNAVAILABLE (RUID);""")
-        self.cursor.execute("""ALTER TABLE RESERVE ADD FOREIGN KEY (CLID)
-        REFERENCES CLIENT (CLID);""")
-        self.cursor.execute("""ALTER TABLE ROOMUNAVAILABLE ADD
-        FOREIGN KEY (RID) REFERENCES ROOM (RID);""")
-        self.cursor.execute("""ALTER TABLE ROOM ADD
-        FOREIGN KEY (HID) REFERENCES HOTEL (HID);""")
-        self.cursor.execute("""ALTER TABLE ROOM ADD
-        FOREIGN KEY (RDID) REFERENCES ROOMDESCRIPTION (RDID);""")
-        self.cursor.execute("""ALTER TABLE LOGIN ADD
-        FOREIGN KEY (EID) REFERENCES EMPLOYEE (EID);""")
+            f"REFRESH MATERIALIZED VIEW {concurrently}{view};")
+        self.conn.commit()
+
+    def refreshMaterializedViews(self):
+        """Refresh every materialized view, one after the other."""
+        for view in MATERIALIZED_VIEWS:
+            self.refreshMaterializedView(view)
+
+
+class DatabaseConnection(DatabaseSession):
+    """Create database tables and hand out pooled database sessions.
+
+    Connections are opened on demand up to maxSize and kept open once
+    returned. The object itself is a session over one of the pooled
+    connections so existing code can keep using its conn and cursor
+    attributes, threads must each use their own session instead.
+    """
+
+    MIN_SIZE = 1
+    MAX_SIZE = 16
+    # Connections idle for longer than this are pinged before being reused.
+    HEALTH_CHECK_SECONDS = 30.0
+    # Number of query results cached and the seconds they are served for.
+    CACHE_SIZE = 256
+    CACHE_SECONDS = 60.0
+    # Secondary indexes built at the same time and the memory of each build.
+    INDEX_WORKERS = 4
+    INDEX_MEMORY = "128MB"
+
+    def __init__(self,
+                 DB_NAME: str,
+                 DB_USER: str,
+                 DB_PASS: str,
+                 DB_HOST: str,
+                 DB_PORT: str,
+                 minSize: int = MIN_SIZE,
+                 maxSize: int = MAX_SIZE,
+                 instrumentation: Optional[Instrumentation] = None,
+                 partitioned: bool = False):
+        """Create DatabaseConnection object and the schema if it is outdated.
+
+        :param minSize Connections opened up front and kept open.
+        :param maxSize Largest number of connections open at once, including
+        the connection of the object itself. Sessions wait for a connection
+        to be returned once every one of them is in use.
+        :param instrumentation Records every statement run by the object and
+        its sessions when given.
+        :param partitioned Create the PARTITIONED_TABLES partitioned by range
+        when the schema is applied. Existing tables are left as they are.
+        """
+        if not 1 <= minSize <= maxSize:
+            raise ValueError(f"Invalid pool size: {minSize} to {maxSize}")
+        self.connect = partial(psycopg2.connect,
+                               database=DB_NAME,
+                               user=DB_USER,
+                               password=DB_PASS,
+                               host=DB_HOST,
+                               port=DB_PORT)
+        self.slots = threading.BoundedSemaphore(maxSize)
+        self.lock = threading.Lock()
+        self.closed = False
+        # Idle connections and the time they were returned, most recent last.
+        self.idle: List[Tuple[connection, float]] = [
+            (self.connect(), time.monotonic()) for _ in range(minSize)
+        ]
+        # Results of the top-N queries, emptied when the views are refreshed.
+        self.results = ResultCache(self.CACHE_SIZE, self.CACHE_SECONDS)
+        self.instrumentation = instrumentation
+        self.partitioned = partitioned
+        super().__init__(self.checkout(), instrumentation)
+        self.bootstrapSchema()
+
+    def getSchemaVersion(self) -> int:
+        """Get the version of the schema applied to the database, 0 if none."""
+        try:
+            self.cursor.execute("SELECT max(version) FROM SchemaVersion;")
+        except psycopg2.errors.UndefinedTable:
+            self.conn.rollback()
+            return 0
+        version = self.cursor.fetchone()[0]
+        self.conn.rollback()
+        return version or 0
+
+    def bootstrapSchema(self) -> bool:
+        """Create the schema in a single transaction if it is outdated.
+
+        Returns True when the schema had to be applied. A current schema
+        costs a single query, concurrent bootstraps wait for each other.
+        """
+        if self.getSchemaVersion() >= SCHEMA_VERSION:
+            return False
+        self.cursor.execute(schemaDdl(self.partitioned))
         self.conn.commit()
+        return True
+
+    def checkout(self) -> connection:
+        """Take a healthy connection out of the pool.
+
+        Opens a new connection when none is idle, waits for one to be
+        returned when maxSize are already in use and replaces the idle
+        connections that fail their health check.
+        """
+        self.slots.acquire()
+        try:
+            while True:
+                with self.lock:
+                    if self.closed:
+                        raise psycopg2.InterfaceError("Pool is closed")
+                    idle = self.idle.pop() if self.idle else None
+                if idle is None:
+                    return self.connect()
+                conn, returned = idle
+                if self.isHealthy(conn, returned):
+                    return conn
+                conn.close()
+        except BaseException:
+            self.slots.release()
+            raise
+
+    def isHealthy(self, conn: connection, returned: float) -> bool:
+        """Check if an idle connection can still be used.
+
+        Connections idle for longer than HEALTH_CHECK_SECONDS are pinged.
+        """
+        if isBroken(conn):
+            return False
+        if time.monotonic() - returned <= self.HEALTH_CHECK_SECONDS:
+            return True
+        try:
+            with conn.cursor() as cursor:
+                cursor.execute("SELECT 1;")
+            conn.rollback()
+        except psycopg2.Error:
+            return False
+        return True
+
+    def checkin(self, conn: connection):
+        """Return a connection to the pool, closing it if it is broken."""
+        try:
+            if not isBroken(conn) and (conn.get_transaction_status()
+                                       != TRANSACTION_STATUS_IDLE):
+                conn.rollback()
+            with self.lock:
+                if not self.closed and not isBroken(conn):
+                    self.idle.append((conn, time.monotonic()))
+                    return
+            conn.close()
+        except psycopg2.Error:
+            conn.close()
+        finally:
+            self.slots.release()
+
+    @contextmanager
+    def session(self) -> Iterator[DatabaseSession]:
+        """Check out a session with its own cursor and transaction.
+
+        The transaction is committed when the block exits normally and rolled
+        back when it raises. The connection goes back to the pool either way.
+        """
+        conn = self.checkout()
+        try:
+            session = DatabaseSession(conn, self.instrumentation)
+            try:
+                yield session
+                conn.commit()
+            except BaseException:
+                if not conn.closed:
+                    conn.rollback()
+                raise
+            finally:
+                if not conn.closed:
+                    session.cursor.close()
+        finally:
+            self.checkin(conn)
+
+    def refreshMaterializedViews(self):
+        """Refresh every materialized view, each in its own session.
+
+        The views are refreshed at the same time and the cached query
+        results are evicted once all of them are up to date.
+        """
+        def refresh(view: str):
+            with self.session() as session:
+                session.refreshMaterializedView(view)
+
+        with ThreadPoolExecutor(max_workers=len(MATERIALIZED_VIEWS)) as pool:
+            for future in [pool.submit(refresh, view)
+                           for view in MATERIALIZED_VIEWS]:
+                future.result()
+        self.results.clear()
+
+    def createSecondaryIndexes(self) -> Dict[str, float]:
+        """Build every secondary index, each in its own session.
+
+        The indexes are built at the same time, every build is timed and
+        recorded under the index stage of its table. Returns the seconds
+        every index took.
+        """
+        def build(index: str) -> float:
+            table = SECONDARY_INDEXES[index][0]
+            start = time.perf_counter()
+            with self.session() as session:
+                session.createSecondaryIndex(index, self.INDEX_MEMORY)
+            seconds = time.perf_counter() - start
+            if self.instrumentation is not None:
+                metrics = StageMetrics(table, "index")
+                metrics.seconds = seconds
+                self.instrumentation.record(metrics)
+            return seconds
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=self.INDEX_WORKERS) as pool:
+            futures = {index: pool.submit(build, index)
+                       for index in SECONDARY_INDEXES}
+            seconds = {index: future.result()
+                       for index, future in futures.items()}
+        for index, indexSeconds in seconds.items():
+            print(f"{index}: built in {indexSeconds:.3f}s")
+        print(f"Built {len(seconds)} indexes in "
+              f"{time.perf_counter() - start:.3f}s")
+        return seconds
+
+    def queryCached(self, query: str, parameters: Sequence = ()) -> list:
+        """Run a read only query, or get its result from the cache."""
+        def fetch() -> list:
+            with self.session() as session:
+                session.cursor.execute(query, parameters)
+                return session.cursor.fetchall()
+
+        return self.results.get((query, tuple(parameters)), fetch)
+
+    def getMostReservedRooms(self, count: int = 10) -> list:
+        """Get rid, reservations and revenue of the most reserved rooms."""
+        return self.queryCached(
+            """SELECT rid, reservations, revenue FROM RoomReservations
+            ORDER BY reservations DESC, rid LIMIT %s;""", (count, ))
+
+    def getHighestRevenueHotels(self, count: int = 10) -> list:
+        """Get hid, hname, hcity, reservations and revenue of top hotels."""
+        return self.queryCached(
+            """SELECT hid, hname, hcity, reservations, revenue
+            FROM HotelRevenue ORDER BY revenue DESC, hid LIMIT %s;""",
+            (count, ))
+
+    def getBestClients(self, count: int = 10) -> list:
+        """Get the longest standing clients, by amount spent within a year.
+
+        Rows hold clid, fname, lname, memberyear, reservations and spent.
+        """
+        return self.queryCached(
+            """SELECT clid, fname, lname, memberyear, reservations, spent
+            FROM ClientReservations
+            ORDER BY memberyear DESC, spent DESC, clid LIMIT %s;""",
+            (count, ))
+
+    def getPaymentMix(self) -> list:
+        """Get payment, reservations, revenue and share of every method."""
+        return self.queryCached(
+            """SELECT payment, reservations, revenue, share FROM PaymentMix
+            ORDER BY reservations DESC, payment;""")
+
+    def getLongestStay(self) -> int:
+        """Get the most days between the start and end of any stay."""
+        return self.queryCached(
+            """SELECT coalesce(max(enddate - startdate), 0)
+            FROM RoomUnavailable;""")[0][0]
+
+    def getUnavailableRooms(self, start: date, end: date) -> List[int]:
+        """Get the sorted rids unavailable on any day from start to end.
+
+        The startdate bounds let a partitioned RoomUnavailable skip every
+        partition outside of the window and the longest stay before it.
+        """
+        return [row[0] for row in self.queryCached(
+            """SELECT DISTINCT rid FROM RoomUnavailable
+            WHERE startdate BETWEEN %s AND %s AND enddate >= %s
+            ORDER BY rid;""",
+            (start - timedelta(days=self.getLongestStay()), end, start))]
+
+    def getRevenueByHotel(self, start: date, end: date) -> list:
+        """Get hid, reservations and revenue of the stays starting in range.
+
+        Hotels are sorted by decreasing revenue, a partitioned
+        RoomUnavailable only scans the partitions from start to end.
+        """
+        return self.queryCached(
+            """SELECT rm.hid, count(*) AS reservations,
+            sum(r.total_cost) AS revenue
+            FROM RoomUnavailable ru JOIN Reserve r ON r.ruid = ru.ruid
+            JOIN Room rm ON rm.rid = ru.rid
+            WHERE ru.startdate BETWEEN %s AND %s
+            GROUP BY rm.hid ORDER BY revenue DESC, rm.hid;""", (start, end))
+
+    def close(self):
+        """Close the connection of the object and every idle connection.
+
+        Sessions still in use are closed when they are returned.
+        """
+        lock = getattr(self, "lock", None)
+        if lock is None:
+            return
+        with lock:
+            self.closed = True
+            idle, self.idle = self.idle, []
+        for conn, _ in idle:
+            conn.close()
+        if getattr(self, "conn", None) is not None:
+            self.conn.close()
+
+    def __enter__(self) -> "DatabaseConnection":
+        """Return the object to close its pool at the end of a with block."""
+        return self
+
+    def __exit__(self, *exc):
+        """Close every connection of the pool."""
+        self.close()
+
+    def __del__(self):
+        """Close database connections when object is destroyed."""
+        self.close()
@@ -0,0 +1,194 @@
+"""Incremental (delta) load module for the Phase 1 loaders.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. The size and SHA-256 fingerprint of every source file are
+kept in the LoadState table. On the next run unchanged sources are skipped, sources that have only grown are
+read from where the previous load stopped and other changed sources are read
+whole. The rows read are checked against the keys of the tables they
+reference and merged with ``INSERT ... ON CONFLICT DO UPDATE``, which only
+rewrites the rows that differ.
+"""
+import hashlib
+import time
+from typing import Dict, Iterable, Optional, Tuple, Type
+
+from bulk_load import COPY_METHOD, BulkLoader, BulkLoadStats
+from data_extraction import TableRawData
+from database import DatabaseConnection, DatabaseSession
+from load_orchestrator import LOADERS, dependencyGraph, dependencyLevels
+from referential_integrity import ReferentialValidator
+
+READ_SIZE = 1 << 20
+
+
+def fileFingerprint(
+        path: str,
+        prefixSize: Optional[int] = None) -> Tuple[int, str, Optional[str]]:
+    """Return the size and SHA-256 of path, and of its first prefixSize bytes.
+
+    Both digests are computed in a single read of the file. The prefix digest
+    is None when prefixSize is omitted or larger than the file.
+    """
+    hasher = hashlib.sha256()
+    size = 0
+    prefix = hasher.hexdigest() if prefixSize == 0 else None
+    with open(path, "rb") as file:
+        while True:
+            data = file.read(READ_SIZE)
+            if not data:
+                break
+            if prefixSize is not None and size < prefixSize <= size + len(
+                    data):
+                split = prefixSize - size
+                hasher.update(data[:split])
+                prefix = hasher.copy().hexdigest()
+                hasher.update(data[split:])
+            else:
+                hasher.update(data)
+            size += len(data)
+    return size, hasher.hexdigest(), prefix
+
+
+class DeltaLoader:
+    """Bring every table up to date with its source file.
+
+    Tables are worked on one at a time, referenced tables first, over a
+    single connection so rows can be merged into tables that already have
+    their foreign keys. Only text sources that were appended to are read
+    from where the previous load stopped, a changed sqlite source is always
+    read whole since any of its rows may have been edited. Rows deleted
+    from a source are never deleted from its table.
+    """
+
+    def __init__(self,
+                 conn: DatabaseSession,
+                 loaders: Iterable[Type[TableRawData]] = LOADERS,
+                 method: str = COPY_METHOD,
+                 fullRefresh: bool = False,
+                 validator: Optional[ReferentialValidator] = None):
+        """Construct DeltaLoader.
+
+        :param conn Database connection used for every table.
+        :param loaders TableRawData subclasses to bring up to date.
+        :param method Bulk load method used to send the rows.
+        :param fullRefresh Read and merge every source row even when the
+        source looks unchanged or only appended to.
+        :param validator Checks the rows read against the keys the
+        referenced tables hold before merging them, raising on orphans by
+        default.
+        """
+        self.conn = conn
+        self.loaders = {loader.TABLE: loader for loader in loaders}
+        self.method = method
+        self.fullRefresh = fullRefresh
+        self.validator = validator or ReferentialValidator()
+
+    def getLoadOrder(self):
+        """Get the tables ordered by dependency level, referenced first."""
+        ordered = [
+            table for level in dependencyLevels(dependencyGraph())
+            for table in level if table in self.loaders
+        ]
+        return ordered + sorted(set(self.loaders) - set(ordered))
+
+    def getState(self, table: str) -> Optional[Tuple[str, int, str]]:
+        """Get the source, size and fingerprint of the source of table.
+
+        Returns None when the table has never been loaded in delta mode.
+        """
+        self.conn.cursor.execute(
+            """SELECT source, size, fingerprint FROM LoadState
+            WHERE tname = %s;""", (table, ))
+        return self.conn.cursor.fetchone()
+
+    def saveState(self, loader: Type[TableRawData], size: int,
+                  fingerprint: str):
+        """Record the size and fingerprint of the source of the table."""
+        self.conn.cursor.execute(
+            """INSERT INTO LoadState (tname, source, size, fingerprint)
+            VALUES (%s, %s, %s, %s)
+            ON CONFLICT (tname) DO UPDATE SET source = EXCLUDED.source,
+            size = EXCLUDED.size, fingerprint = EXCLUDED.fingerprint,
+            loaded = now();""",
+            (loader.TABLE, loader.SOURCE, size, fingerprint))
+        self.conn.conn.commit()
+
+    def isEmpty(self, table: str) -> bool:
+        """Check if table has no rows."""
+        self.conn.cursor.execute(f"select 1 from {table} limit 1;")
+        return self.conn.cursor.fetchone() is None
+
+    def loadTable(self,
+                  loader: Type[TableRawData]) -> Optional[BulkLoadStats]:
+        """Bring a single table up to date with its source file.
+
+        Returns the bulk load statistics, or None when the source has not
+        changed since the previous load.
+        """
+        state = self.getState(loader.TABLE)
+        if state is None:
+            if self.isEmpty(loader.TABLE):
+                size, fingerprint, _ = fileFingerprint(loader.SOURCE)
+                loaded = loader()
+                self.validator.validate({loader.TABLE: loaded}, self.conn)
+                stats = loaded.insertSanitizedData(self.conn, self.method)
+                self.saveState(loader, size, fingerprint)
+                return stats
+            source, oldSize, oldFingerprint = None, 0, None
+        else:
+            source, oldSize, oldFingerprint = state
+        size, fingerprint, prefix = fileFingerprint(loader.SOURCE, oldSize)
+
+        if self.fullRefresh or source != loader.SOURCE:
+            columns = loader.readColumns()
+        elif fingerprint == oldFingerprint:
+            print(f"{loader.TABLE}: {loader.SOURCE} is unchanged, skipped")
+            return None
+        elif prefix == oldFingerprint:
+            # Only rows appended since the previous load are read.
+            columns = loader.readNewColumns(oldSize)
+        else:
+            # Rows may have been edited anywhere in the source.
+            columns = loader.readColumns()
+
+        if loader.ADD_PRIMARY_KEY and not self.conn.hasPrimaryKey(
+                loader.TABLE):
+            loader.finalizeTable(self.conn)
+        loaded = loader(columns)
+        self.validator.validate({loader.TABLE: loaded}, self.conn)
+        column = loader.getPartitionColumn(self.conn)
+        if column is not None:
+            self.conn.createPartitions(loader.TABLE,
+                                       loaded.getCleanBatch()[column])
+        stats = BulkLoader(self.conn, self.method).upsertRecords(
+            loader.TABLE, loader.getColumns(), loaded.getCleanRows(),
+            loader.PRIMARY_KEY, replace=column is not None)
+        loader.finalizeTable(self.conn)
+        self.saveState(loader, size, fingerprint)
+        return stats
+
+    def run(self) -> Dict[str, Optional[BulkLoadStats]]:
+        """Bring every table up to date, add missing foreign keys and refresh
+        the materialized views when any table changed.
+
+        Returns the bulk load statistics of every table, None for the
+        tables whose source was unchanged.
+        """
+        start = time.perf_counter()
+        results = {
+            table: self.loadTable(self.loaders[table])
+            for table in self.getLoadOrder()
+        }
+        self.conn.addForeignKeyConstraints()
+        changed = sum(stats is not None for stats in results.values())
+        if changed:
+            self.conn.refreshMaterializedViews()
+        print(f"Delta load of {len(results)} tables ({changed} changed) in "
+              f"{time.perf_counter() - start:.3f}s")
+        return results
+
+
+if __name__ == "__main__":
+    with DatabaseConnection("db", "uwu", "uwu", "127.0.0.1",
+                            "5432") as database:
+        DeltaLoader(database).run()
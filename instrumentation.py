@@ -0,0 +1,288 @@
+"""Timing and row count instrumentation of the load pipeline.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Every loader stage (parse, sanitize, insert, finalize)
+is recorded with its wall time, rows and the peak resident memory of the
+process, the statements run through an instrumented DatabaseConnection are
+added up by statement text, and the records are exported as JSON or as a
+Prometheus text file.
+"""
+import cProfile
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+from psycopg2.extensions import cursor
+
+try:
+    import resource
+except ImportError:
+    # Peak memory is not reported where resource is missing, like Windows.
+    resource = None
+
+# Stage of the records of the database statements.
+STATEMENT_STAGE = "statement"
+# Longest statement text kept in a record.
+STATEMENT_LENGTH = 80
+WHITESPACE = re.compile(r"\s+")
+# Value lists of INSERT statements, which differ between runs of a statement.
+VALUES_LIST = re.compile(r"\bVALUES\b.*", re.IGNORECASE | re.DOTALL)
+# Counters written to the Prometheus text file and their descriptions.
+PROMETHEUS_COUNTERS = {
+    "seconds": "Wall time of the stage",
+    "runs": "Times the stage ran",
+    "rows_in": "Rows given to the stage",
+    "rows_out": "Rows returned by the stage",
+    "rejected": "Rows rejected by the stage",
+}
+
+
+def peakRss() -> Optional[int]:
+    """Get the peak resident memory of the process in bytes."""
+    if resource is None:
+        return None
+    # ru_maxrss is in KiB on Linux.
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+
+def statementLabel(query) -> str:
+    """Get the first STATEMENT_LENGTH characters of query on a single line.
+
+    Value lists are left out, so the pages of an INSERT ... VALUES share a
+    label whatever values they hold.
+    """
+    if isinstance(query, bytes):
+        query = query[:STATEMENT_LENGTH * 4].decode("utf-8", "replace")
+    query = VALUES_LIST.sub("VALUES ...", str(query))
+    return WHITESPACE.sub(" ", query).strip()[:STATEMENT_LENGTH]
+
+
+class StageMetrics:
+    """Class used to represent the measurements of a single stage run."""
+
+    def __init__(self,
+                 table: Optional[str],
+                 stage: str,
+                 rowsIn: Optional[int] = None):
+        """Construct StageMetrics.
+
+        :param table Table the stage worked on, None for stages covering
+        every table and the statement text for database statements.
+        :param stage Name of the stage, like parse, sanitize or insert.
+        :param rowsIn Number of rows given to the stage, if any.
+        """
+        self.table = table
+        self.stage = stage
+        self.rowsIn = rowsIn
+        # Set by the stage once it is done.
+        self.rowsOut: Optional[int] = None
+        self.rejected: Optional[int] = None
+        self.seconds = 0.0
+        self.peakRss: Optional[int] = None
+        # Number of runs added up in the measurements.
+        self.runs = 1
+
+    def toDict(self) -> dict:
+        """Return the measurements as a dictionary of JSON values."""
+        return {
+            "table": self.table,
+            "stage": self.stage,
+            "seconds": round(self.seconds, 6),
+            "runs": self.runs,
+            "rows_in": self.rowsIn,
+            "rows_out": self.rowsOut,
+            "rejected": self.rejected,
+            "peak_rss": self.peakRss,
+        }
+
+    def __str__(self) -> str:
+        """Return string representation of StageMetrics."""
+        return (f"{self.table} {self.stage}: {self.seconds:.3f}s, "
+                f"{self.rowsIn} rows in, {self.rowsOut} rows out")
+
+
+class Instrumentation:
+    """Thread-safe collector of the measurements of a load.
+
+    Stages of profileTable also run under cProfile, their statistics are
+    written to profilePath once each stage is done.
+    """
+
+    def __init__(self,
+                 profileTable: Optional[str] = None,
+                 profilePath: Optional[str] = None):
+        """Construct Instrumentation.
+
+        :param profileTable Table whose stages are profiled, none when
+        omitted.
+        :param profilePath File the profile is written to, readable with
+        pstats, profileTable.prof by default.
+        """
+        self.profileTable = profileTable
+        self.profilePath = profilePath or f"{profileTable}.prof"
+        self.profiler = cProfile.Profile() if profileTable else None
+        self.lock = threading.Lock()
+        self.metrics: List[StageMetrics] = []
+        # Statements added up by statementLabel, one record per text.
+        self.statements: Dict[str, StageMetrics] = {}
+
+    def record(self, metrics: StageMetrics):
+        """Add the measurements of a finished stage."""
+        metrics.peakRss = peakRss()
+        with self.lock:
+            self.metrics.append(metrics)
+
+    def recordStatement(self, label: str, seconds: float,
+                        rows: Optional[int] = None):
+        """Add a statement run to the record of its label.
+
+        :param label Statement text, as returned by statementLabel.
+        :param seconds Wall time of the statement.
+        :param rows Rows the statement affected or returned, if known.
+        """
+        with self.lock:
+            metrics = self.statements.get(label)
+            if metrics is None:
+                metrics = StageMetrics(label, STATEMENT_STAGE)
+                metrics.runs = 0
+                self.statements[label] = metrics
+            metrics.runs += 1
+            metrics.seconds += seconds
+            if rows is not None:
+                metrics.rowsOut = (metrics.rowsOut or 0) + rows
+
+    @contextmanager
+    def stage(self,
+              table: Optional[str],
+              stage: str,
+              rowsIn: Optional[int] = None) -> Iterator[StageMetrics]:
+        """Time the block as a stage of table.
+
+        The block may set rowsOut and rejected on the metrics it is given.
+        The stage is recorded even if the block raises.
+        """
+        metrics = StageMetrics(table, stage, rowsIn)
+        profiler = self.profiler if table == self.profileTable else None
+        if profiler is not None:
+            profiler.enable()
+        start = time.perf_counter()
+        try:
+            yield metrics
+        finally:
+            metrics.seconds = time.perf_counter() - start
+            if profiler is not None:
+                profiler.disable()
+                with self.lock:
+                    profiler.dump_stats(self.profilePath)
+            self.record(metrics)
+
+    def getMetrics(self, stage: Optional[str] = None) -> List[StageMetrics]:
+        """Get the recorded measurements, only those of stage if given.
+
+        Statements come last, one record per statement text.
+        """
+        with self.lock:
+            return [
+                metrics
+                for metrics in self.metrics + list(self.statements.values())
+                if stage is None or metrics.stage == stage
+            ]
+
+    def toJson(self) -> str:
+        """Return every recorded measurement as a JSON array."""
+        return json.dumps([metrics.toDict() for metrics in self.getMetrics()],
+                          indent=4)
+
+    def writeJson(self, path: str):
+        """Write every recorded measurement to path as a JSON array."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.toJson())
+
+    def toPrometheus(self) -> str:
+        """Return the measurements in the Prometheus text format.
+
+        Repeated stages of a table are added together. Statements are
+        labelled with their text.
+        """
+        totals: Dict[Tuple[str, str], Dict[str, float]] = {}
+        for metrics in self.getMetrics():
+            total = totals.setdefault(
+                (metrics.table or "", metrics.stage), {
+                    name: 0
+                    for name in PROMETHEUS_COUNTERS
+                })
+            total["seconds"] += metrics.seconds
+            total["runs"] += metrics.runs
+            total["rows_in"] += metrics.rowsIn or 0
+            total["rows_out"] += metrics.rowsOut or 0
+            total["rejected"] += metrics.rejected or 0
+        lines = []
+        for name, description in PROMETHEUS_COUNTERS.items():
+            metric = f"etl_stage_{name}_total"
+            lines.append(f"# HELP {metric} {description}.")
+            lines.append(f"# TYPE {metric} counter")
+            for (table, stage), total in totals.items():
+                label = "statement" if stage == STATEMENT_STAGE else "table"
+                table = table.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{metric}{{{label}="{table}",stage="{stage}"}} '
+                             f'{total[name]}')
+        rss = peakRss()
+        if rss is not None:
+            lines.append("# HELP etl_peak_rss_bytes Peak resident memory.")
+            lines.append("# TYPE etl_peak_rss_bytes gauge")
+            lines.append(f"etl_peak_rss_bytes {rss}")
+        return "\n".join(lines) + "\n"
+
+    def writePrometheus(self, path: str):
+        """Write the measurements to path in the Prometheus text format."""
+        with open(path, "w", encoding="utf-8") as file:
+            file.write(self.toPrometheus())
+
+    def __str__(self) -> str:
+        """Return string representation of Instrumentation."""
+        return (f"Instrumentation({len(self.metrics)} records, "
+                f"{len(self.statements)} statements)")
+
+
+class TimedCursor(cursor):
+    """psycopg2 cursor recording every statement it runs.
+
+    Statements are added up under the statement stage, with the statement
+    text as table and the rows they affected or returned as rowsOut.
+    """
+
+    # Set by DatabaseSession on the cursors it creates.
+    instrumentation: Optional[Instrumentation] = None
+
+    @contextmanager
+    def timed(self, query) -> Iterator[None]:
+        """Time the block as a statement running query."""
+        if self.instrumentation is None:
+            yield
+            return
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.instrumentation.recordStatement(
+                statementLabel(query),
+                time.perf_counter() - start,
+                self.rowcount if self.rowcount >= 0 else None)
+
+    def execute(self, query, vars=None):
+        """Run query, see psycopg2.extensions.cursor.execute."""
+        with self.timed(query):
+            return super().execute(query, vars)
+
+    def executemany(self, query, vars_list):
+        """Run query once per parameters, see cursor.executemany."""
+        with self.timed(query):
+            return super().executemany(query, vars_list)
+
+    def copy_expert(self, sql, file, size=8192):
+        """Run a COPY statement, see cursor.copy_expert."""
+        with self.timed(sql):
+            return super().copy_expert(sql, file, size)
@@ -0,0 +1,357 @@
+"""Parallel load orchestration module for the Phase 1 loaders.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Tables are loaded at the same time over separate
+connections and the sequence, index and foreign key work is left to a final
+phase that runs once every table has been loaded. Source files can
+optionally be parsed in a process pool, in which case the workers send back
+one NumPy array per column rather than pickled record objects.
+"""
+import multiprocessing
+import time
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from typing import (Callable, Dict, Iterable, List, Optional, Set, Tuple, Type,
+                    Union)
+
+from bulk_load import COPY_METHOD, BulkLoadStats
+from data_extraction import (
+    ChainsTableRawData, ClientTableRawData, EmployeeTableRawData,
+    HotelTableRawData, LoginTableRawData, ReserveTableRawData,
+    RoomDescriptionTableRawData, RoomTableRawData, RoomUnavailableTableRawData,
+    TableRawData, Columns)
+from database import FOREIGN_KEYS, DatabaseConnection
+from instrumentation import Instrumentation
+from record_batch import RecordBatch
+from referential_integrity import ReferentialValidator
+from source_cache import SourceCache
+
+LOADERS: Tuple[Type[TableRawData], ...] = (
+    ChainsTableRawData,
+    HotelTableRawData,
+    EmployeeTableRawData,
+    LoginTableRawData,
+    RoomDescriptionTableRawData,
+    RoomTableRawData,
+    RoomUnavailableTableRawData,
+    ClientTableRawData,
+    ReserveTableRawData,
+)
+
+
+def dependencyGraph(
+        foreignKeys: Iterable[Tuple[str, str, str, str]] = FOREIGN_KEYS
+) -> Dict[str, Set[str]]:
+    """Return a map of every table to the set of tables it references."""
+    graph: Dict[str, Set[str]] = {}
+    for child, _, parent, _ in foreignKeys:
+        graph.setdefault(child, set()).add(parent)
+        graph.setdefault(parent, set())
+    return graph
+
+
+def dependencyLevels(graph: Dict[str, Set[str]]) -> List[List[str]]:
+    """Group tables so every table comes after the tables it references.
+
+    Tables in the same level do not depend on each other and can be worked
+    on at the same time.
+    """
+    remaining = {table: set(parents) for table, parents in graph.items()}
+    levels = []
+    while remaining:
+        level = sorted(table for table, parents in remaining.items()
+                       if not parents)
+        if not level:
+            raise ValueError("Foreign keys form a cycle between tables: "
+                             f"{sorted(remaining)}")
+        levels.append(level)
+        for table in level:
+            del remaining[table]
+        for parents in remaining.values():
+            parents.difference_update(level)
+    return levels
+
+
+def parserPool(maxWorkers: Optional[int] = None) -> ProcessPoolExecutor:
+    """Return a process pool for parsing sources.
+
+    Workers are spawned rather than forked since the parent process already
+    runs loader threads and holds open database connections.
+    """
+    return ProcessPoolExecutor(max_workers=maxWorkers,
+                               mp_context=multiprocessing.get_context("spawn"))
+
+
+def parseSources(loaders: Iterable[Type[TableRawData]] = LOADERS,
+                 maxWorkers: Optional[int] = None
+                 ) -> Dict[str, Tuple[Columns, Dict[str, int]]]:
+    """Parse every source file in a process pool.
+
+    Returns the parsed columns of every loader and the rows its reader
+    rejected, as returned by readSource, keyed by table name. They are the
+    columns and sourceRejected arguments of the loader constructors.
+    """
+    loaders = list(loaders)
+    with parserPool(maxWorkers) as pool:
+        futures = {
+            loader.TABLE: pool.submit(loader.readSource)
+            for loader in loaders
+        }
+        return {table: future.result() for table, future in futures.items()}
+
+
+class LoadOrchestrator:
+    """Load every table in parallel and finish with the constraint phase.
+
+    Every table is read and sanitized first and the foreign keys of the
+    clean batches are checked in memory before the first insert. The
+    foreign key constraints are dropped during the load and added back once
+    every table is loaded.
+    """
+
+    def __init__(self,
+                 database: DatabaseConnection,
+                 loaders: Iterable[Type[TableRawData]] = LOADERS,
+                 maxWorkers: Optional[int] = None,
+                 method: str = COPY_METHOD,
+                 parseProcesses: Optional[int] = None,
+                 chunkSize: Optional[int] = None,
+                 instrumentation: Optional[Instrumentation] = None,
+                 cache: Optional[SourceCache] = None,
+                 validator: Optional[ReferentialValidator] = None):
+        """Construct LoadOrchestrator.
+
+        :param database Pooled connection, every table is loaded in its own
+        session. The pool should hold at least maxWorkers + 1 connections.
+        :param loaders TableRawData subclasses to read and insert.
+        :param maxWorkers Number of tables loaded at the same time, all of
+        them by default.
+        :param method Bulk load method passed to insertSanitizedData.
+        :param parseProcesses Number of processes used to parse the source
+        files. Sources are parsed by the loader threads when omitted.
+        :param chunkSize Stream every source in chunks of this many rows
+        instead of reading it whole, can't be combined with parseProcesses.
+        :param instrumentation Records the stages of every table, the one of
+        database when omitted or a new one if database has none.
+        :param cache Cache of the clean columns of every source. Unchanged
+        sources are mapped from it instead of being parsed and sanitized,
+        streamed sources don't use it.
+        :param validator Checks the foreign keys of the sanitized tables
+        before any of them is inserted. By default orphans are reported and
+        the run stops before changing the database. Streamed sources are not
+        checked.
+        """
+        if parseProcesses and chunkSize:
+            raise ValueError("Sources parsed in processes are read whole, "
+                             "parseProcesses and chunkSize are exclusive")
+        self.database = database
+        self.loaders = {loader.TABLE: loader for loader in loaders}
+        self.maxWorkers = maxWorkers or len(self.loaders)
+        self.method = method
+        self.parseProcesses = parseProcesses
+        self.chunkSize = chunkSize
+        self.instrumentation = (instrumentation or database.instrumentation
+                                or Instrumentation())
+        self.cache = cache
+        self.validator = validator or ReferentialValidator()
+        self.levels = dependencyLevels(dependencyGraph())
+        self.listeners: List[Callable[[Dict[str, RecordBatch]], None]] = []
+        missing = {table for level in self.levels
+                   for table in level} - set(self.loaders)
+        if missing:
+            raise ValueError(f"No loader for referenced tables: {missing}")
+
+    def addListener(self, listener: Callable[[Dict[str, RecordBatch]],
+                                             None]):
+        """Call listener with the clean batches at the end of every run.
+
+        Streamed tables are not held in memory and have no batch.
+        """
+        self.listeners.append(listener)
+
+    def getLoadOrder(self) -> List[str]:
+        """Get the tables ordered by dependency level, referenced first."""
+        ordered = [table for level in self.levels for table in level]
+        return ordered + sorted(set(self.loaders) - set(ordered))
+
+    def prepareTable(self,
+                     table: str,
+                     parsed: Optional[Future] = None
+                     ) -> Tuple[TableRawData, float]:
+        """Read and sanitize a single table, from the cache when possible.
+
+        :param table Name of the table to prepare.
+        :param parsed Future of the readSource result of a worker process.
+
+        Returns the loader and the wall time spent reading it.
+        """
+        start = time.perf_counter()
+        loaded = None
+        if self.cache is not None and parsed is None:
+            with self.instrumentation.stage(table, "cache") as stage:
+                loaded = self.cache.load(self.loaders[table])
+                if loaded is not None:
+                    stage.rowsOut = len(loaded.getCleanBatch())
+        if loaded is None:
+            loaded = self.parseTable(table, parsed)
+        return loaded, time.perf_counter() - start
+
+    def loadTable(
+        self,
+        table: str,
+        loaded: Optional[TableRawData] = None
+    ) -> Tuple[Union[TableRawData, Type[TableRawData]], BulkLoadStats, float]:
+        """Insert a single table without finalizing it.
+
+        :param table Name of the table to load.
+        :param loaded Loader returned by prepareTable, the source is
+        streamed when chunkSize is set.
+
+        Returns the loader, or its class when the source is streamed, its
+        bulk load statistics and the wall time spent inserting the table.
+        """
+        start = time.perf_counter()
+        loader = self.loaders[table]
+        with self.database.session() as session:
+            if self.chunkSize:
+                with self.instrumentation.stage(table, "stream") as stage:
+                    stats = loader.loadStreaming(session, self.chunkSize,
+                                                 self.method, finalize=False)
+                    stage.rowsOut = stats.rows
+                return loader, stats, time.perf_counter() - start
+            with self.instrumentation.stage(
+                    table, "insert", len(loaded.getCleanBatch())) as stage:
+                stats = loaded.insertSanitizedData(session,
+                                                   self.method,
+                                                   finalize=False)
+                stage.rowsOut = stats.rows
+        return loaded, stats, time.perf_counter() - start
+
+    def validateTables(self, prepared: Dict[str, TableRawData]):
+        """Check the foreign keys of the prepared tables before inserting.
+
+        Keys of tables that are not loaded by this run are read from the
+        database. Raises when the validator reports orphans, before any
+        index is dropped or row inserted.
+        """
+        rows = sum(len(loaded.getCleanBatch()) for loaded in prepared.values())
+        with self.database.session() as session, self.instrumentation.stage(
+                None, "referential_integrity", rows) as stage:
+            self.validator.validate(prepared, session)
+            stage.rowsOut = sum(
+                len(loaded.getCleanBatch()) for loaded in prepared.values())
+            stage.rejected = rows - stage.rowsOut
+
+    def parseTable(self,
+                   table: str,
+                   parsed: Optional[Future] = None) -> TableRawData:
+        """Parse and sanitize the source of a table, caching the result.
+
+        :param table Name of the table to parse.
+        :param parsed Future of the readSource result of a worker process.
+
+        Rows the reader already rejected are counted by the parse stage.
+        """
+        # Sources parsed by a worker process are only waited for.
+        with self.instrumentation.stage(table, "parse") as stage:
+            columns, sourceRejected = (parsed.result() if parsed is not None
+                                       else self.loaders[table].readSource())
+            stage.rowsOut = len(next(iter(columns.values()), ()))
+            stage.rejected = sum(sourceRejected.values())
+        with self.instrumentation.stage(table, "sanitize",
+                                        stage.rowsOut) as stage:
+            loaded = self.loaders[table](columns,
+                                         sourceRejected=sourceRejected)
+            stage.rowsOut = len(loaded.getCleanBatch())
+            stage.rejected = (loaded.getRejectedCount() -
+                              sum(sourceRejected.values()))
+        if self.cache is not None:
+            with self.instrumentation.stage(table, "cache_store",
+                                            stage.rowsOut):
+                self.cache.store(loaded)
+        return loaded
+
+    def finalizeTable(self, loader: Union[TableRawData, Type[TableRawData]]):
+        """Add the primary key and reset the sequence of a loaded table."""
+        with self.database.session() as session, self.instrumentation.stage(
+                loader.TABLE, "finalize"):
+            loader.finalizeTable(session)
+
+    def run(self) -> Dict[str, BulkLoadStats]:
+        """Load all tables, then reset sequences and add any missing keys.
+
+        Secondary indexes and foreign keys are dropped before the first
+        insert and built again once every table is loaded.
+
+        Returns the bulk load statistics of every table.
+        """
+        order = self.getLoadOrder()
+        start = time.perf_counter()
+        parsed: Dict[str, Future] = {}
+        pool = None
+        if self.parseProcesses:
+            pool = parserPool(self.parseProcesses)
+            parsed = {
+                table: pool.submit(self.loaders[table].readSource)
+                for table in order if self.cache is None
+                or not self.cache.isCurrent(self.loaders[table])
+            }
+        try:
+            with ThreadPoolExecutor(max_workers=self.maxWorkers) as executor:
+                # Every source is read before the first insert so the
+                # foreign keys are checked while nothing has been sent.
+                prepared: Dict[str, TableRawData] = {}
+                seconds = dict.fromkeys(order, 0.0)
+                if not self.chunkSize:
+                    futures = {
+                        table: executor.submit(self.prepareTable, table,
+                                               parsed.get(table))
+                        for table in order
+                    }
+                    for table in order:
+                        prepared[table], seconds[table] = (
+                            futures[table].result())
+                    self.validateTables(prepared)
+                with self.database.session() as session:
+                    session.dropSecondaryIndexes()
+                    session.dropForeignKeyConstraints()
+                futures = {
+                    table: executor.submit(self.loadTable, table,
+                                           prepared.get(table))
+                    for table in order
+                }
+                results = {}
+                for table in order:
+                    results[table] = futures[table].result()
+                    seconds[table] += results[table][2]
+                loaded = time.perf_counter()
+                finalizers = [
+                    executor.submit(self.finalizeTable, results[table][0])
+                    for table in order
+                ]
+                for future in finalizers:
+                    future.result()
+        finally:
+            if pool is not None:
+                pool.shutdown(cancel_futures=True)
+        with self.instrumentation.stage(None, "indexes"):
+            self.database.createSecondaryIndexes()
+        with self.database.session() as session, self.instrumentation.stage(
+                None, "foreign_keys"):
+            session.addForeignKeyConstraints()
+        with self.instrumentation.stage(None, "refresh_views"):
+            self.database.refreshMaterializedViews()
+        end = time.perf_counter()
+
+        slowest = max(seconds, key=seconds.get)
+        print(f"Loaded {len(order)} tables in {loaded - start:.3f}s "
+              f"(slowest {slowest} {seconds[slowest]:.3f}s, "
+              f"sum {sum(seconds.values()):.3f}s)")
+        print(f"Keys, sequences, indexes, foreign keys and views in "
+              f"{end - loaded:.3f}s")
+        batches = {
+            table: results[table][0].getCleanBatch()
+            for table in order if isinstance(results[table][0], TableRawData)
+        }
+        for listener in self.listeners:
+            listener(batches)
+        return {table: results[table][1] for table in order}
@@ -0,0 +1,265 @@
+"""Daily room occupancy cube built from the RoomUnavailable records.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Every room has a row of bits, one per day, set when the
+room is unavailable that day. Rooms are grouped by hotel, chain or city so
+occupancy of any group over any date window is a vectorized sum over the
+packed rows instead of a range join between RoomUnavailable and Room.
+"""
+from typing import Iterable, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from availability import Day, dayNumber, dayNumbers
+from database import DatabaseSession
+from pricing import lookup
+from record_batch import RecordBatch
+
+# Room attributes occupancy can be grouped by.
+GROUPS = ("hid", "chid", "hcity")
+# Number of bits set in every byte value.
+POPCOUNT = np.unpackbits(np.arange(256, dtype=np.uint8)[:, None],
+                         axis=1).sum(axis=1).astype(np.uint8)
+
+
+class OccupancyCube:
+    """Bit-packed rooms by days matrix of unavailable room nights.
+
+    Rows follow the sorted rids and bits follow the days starting at
+    firstDay, eight days per byte with the earliest day in the highest bit.
+    firstDay is kept a multiple of eight so the range can grow in whole
+    bytes on both sides when later rows fall outside of it.
+    """
+
+    # Rooms whose rows are unpacked at once when setting bits.
+    BLOCK_ROOMS = 4096
+
+    def __init__(self, rooms: RecordBatch, hotels: RecordBatch):
+        """Construct an OccupancyCube without unavailable days.
+
+        :param rooms Clean Room batch, giving the hotel of every room.
+        :param hotels Clean Hotel batch, giving the chain and city of every
+        hotel.
+        """
+        self.rids = np.empty(0, dtype=np.int64)
+        self.hids = np.empty(0, dtype=np.int64)
+        self.hotelIds = np.asarray(hotels["hid"], dtype=np.int64)
+        self.hotelChains = np.asarray(hotels["chid"], dtype=np.int64)
+        self.hotelCities = np.asarray(hotels["hcity"], dtype=object)
+        self.firstDay = 0
+        self.bits = np.zeros((0, 0), dtype=np.uint8)
+        self.addRooms(rooms["rid"], rooms["hid"])
+
+    @classmethod
+    def fromBatches(cls, rooms: RecordBatch, hotels: RecordBatch,
+                    unavailable: RecordBatch) -> "OccupancyCube":
+        """Build the cube from the clean Room, Hotel and unavailability."""
+        cube = cls(rooms, hotels)
+        cube.addUnavailable(unavailable["rid"], unavailable["startdate"],
+                            unavailable["enddate"])
+        return cube
+
+    @classmethod
+    def fromSources(cls) -> "OccupancyCube":
+        """Build the cube from the rooms, hotels and unavailability files."""
+        from data_extraction import (HotelTableRawData, RoomTableRawData,
+                                     RoomUnavailableTableRawData)
+        return cls.fromBatches(RoomTableRawData().getCleanBatch(),
+                               HotelTableRawData().getCleanBatch(),
+                               RoomUnavailableTableRawData().getCleanBatch())
+
+    @classmethod
+    def fromDatabase(cls, conn: DatabaseSession) -> "OccupancyCube":
+        """Build the cube from the Room, Hotel and RoomUnavailable tables."""
+        conn.cursor.execute("select rid, hid from Room;")
+        rooms = pd.DataFrame(conn.cursor.fetchall(), columns=["rid", "hid"])
+        conn.cursor.execute("select hid, chid, hcity from Hotel;")
+        hotels = pd.DataFrame(conn.cursor.fetchall(),
+                              columns=["hid", "chid", "hcity"])
+        conn.cursor.execute(
+            "select rid, startdate, enddate from RoomUnavailable;")
+        rows = conn.cursor.fetchall()
+        cube = cls({name: rooms[name].to_numpy() for name in rooms},
+                   {name: hotels[name].to_numpy() for name in hotels})
+        cube.addUnavailable([row[0] for row in rows], [row[1] for row in rows],
+                            [row[2] for row in rows])
+        return cube
+
+    @property
+    def days(self) -> int:
+        """Return the number of days covered by the cube."""
+        return self.bits.shape[1] * 8
+
+    def addRooms(self, rids: Iterable[int], hids: Iterable[int]):
+        """Add rooms without unavailable days, known rooms are left as is.
+
+        :param rids Rooms to add.
+        :param hids Hotel of every room, -1 when unknown.
+        """
+        rids = np.asarray(rids, dtype=np.int64)
+        hids = np.asarray(hids, dtype=np.int64)
+        rids, first = np.unique(rids, return_index=True)
+        new = ~np.isin(rids, self.rids)
+        if not new.any():
+            return
+        rids, hids = rids[new], hids[first][new]
+        positions = np.searchsorted(self.rids, rids)
+        self.rids = np.insert(self.rids, positions, rids)
+        self.hids = np.insert(self.hids, positions, hids)
+        self.bits = np.insert(self.bits, positions, 0, axis=0)
+
+    def growDays(self, first: int, last: int):
+        """Extend the covered days to include first through last."""
+        if not self.bits.shape[1]:
+            self.firstDay = first - first % 8
+        before = max(0, (self.firstDay - first + 7) // 8)
+        after = max(0, -(-(last + 1 - self.firstDay) // 8) - before -
+                    self.bits.shape[1])
+        if before or after:
+            self.bits = np.pad(self.bits, ((0, 0), (before, after)))
+            self.firstDay -= before * 8
+
+    def rows(self, rids: np.ndarray) -> np.ndarray:
+        """Get the row of every known room."""
+        rows = np.searchsorted(self.rids, rids)
+        rows[rows == len(self.rids)] = 0
+        if not len(self.rids) or (self.rids[rows] != rids).any():
+            raise KeyError(f"Unknown rooms: {np.setdiff1d(rids, self.rids)}")
+        return rows
+
+    def addUnavailable(self, rids: Iterable[int], starts: Iterable,
+                       ends: Iterable):
+        """Set the bits of every day from start to end, both included.
+
+        Rooms that are not known yet are added without a hotel.
+        """
+        rids = np.asarray(rids, dtype=np.int64)
+        starts, ends = dayNumbers(starts), dayNumbers(ends)
+        keep = ends >= starts
+        rids, starts, ends = rids[keep], starts[keep], ends[keep]
+        if not len(rids):
+            return
+        self.addRooms(rids, np.full(len(rids), -1))
+        self.growDays(int(starts.min()), int(ends.max()))
+        rows = self.rows(rids)
+        touched, intervalRows = np.unique(rows, return_inverse=True)
+        for block in range(0, len(touched), self.BLOCK_ROOMS):
+            inBlock = ((intervalRows >= block)
+                       & (intervalRows < block + self.BLOCK_ROOMS))
+            blockRows = touched[block:block + self.BLOCK_ROOMS]
+            local = intervalRows[inBlock] - block
+            first = (starts[inBlock] - self.firstDay) // 8 * 8
+            width = (ends[inBlock].max() - self.firstDay) // 8 * 8 + 8
+            offset = int(first.min())
+            # +1 at the start and -1 after the end of every interval, the
+            # running sum is positive on every unavailable day.
+            changes = np.zeros((len(blockRows), width - offset + 1),
+                               dtype=np.int32)
+            np.add.at(changes,
+                      (local, starts[inBlock] - self.firstDay - offset), 1)
+            np.add.at(changes,
+                      (local, ends[inBlock] - self.firstDay - offset + 1), -1)
+            unavailable = np.cumsum(changes[:, :-1], axis=1) > 0
+            columns = slice(offset // 8, width // 8)
+            self.bits[blockRows, columns] |= np.packbits(unavailable, axis=1)
+
+    def window(self, start: Day, end: Optional[Day]) -> Tuple[int, int]:
+        """Get the first and last day of a window relative to firstDay."""
+        first = dayNumber(start) - self.firstDay
+        last = first if end is None else dayNumber(end) - self.firstDay
+        if last < first:
+            raise ValueError(f"Window ends before it starts: {start} {end}")
+        return first, last
+
+    def windowBits(self, first: int, last: int) -> np.ndarray:
+        """Get the bytes covering the days first to last of every room.
+
+        Bits of the days outside of the window are cleared and days outside
+        of the cube are read as available.
+        """
+        byteFirst, byteLast = first // 8, last // 8
+        window = np.zeros((len(self.rids), byteLast - byteFirst + 1),
+                          dtype=np.uint8)
+        source = slice(max(byteFirst, 0),
+                       min(byteLast + 1, self.bits.shape[1]))
+        if source.start < source.stop:
+            window[:, source.start - byteFirst:source.stop -
+                   byteFirst] = self.bits[:, source]
+        window[:, 0] &= 0xFF >> (first % 8)
+        window[:, -1] &= (0xFF << (7 - last % 8)) & 0xFF
+        return window
+
+    def groupRows(self, by: str) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the group keys and the group of every room.
+
+        :param by One of hid, chid or hcity. Rooms without a known hotel
+        are grouped under -1, or None for hcity.
+        """
+        if by == "hid":
+            values = self.hids
+        elif by in ("chid", "hcity"):
+            hotelValues = (self.hotelChains
+                           if by == "chid" else self.hotelCities)
+            values, found = lookup(self.hotelIds, hotelValues, self.hids)
+            values = values.astype(object) if by == "hcity" else values
+            values[~found] = -1 if by == "chid" else None
+        else:
+            raise ValueError(f"Occupancy can be grouped by {GROUPS}: {by}")
+        codes, keys = pd.factorize(values, sort=True, use_na_sentinel=False)
+        return np.asarray(keys), codes
+
+    def isOccupied(self, rid: int, day: Day) -> bool:
+        """Check if room rid is unavailable on day."""
+        first, _ = self.window(day, None)
+        return bool(self.windowBits(first, first)[self.rows(
+            np.array([rid]))[0], 0])
+
+    def occupancyRates(self,
+                       by: str,
+                       start: Day,
+                       end: Optional[Day] = None
+                       ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the share of room nights occupied in every group.
+
+        Counts the set bits of the window with a byte lookup table, without
+        unpacking the rows. Returns the group keys and their rates.
+        """
+        first, last = self.window(start, end)
+        nights = POPCOUNT[self.windowBits(first, last)].sum(axis=1)
+        keys, codes = self.groupRows(by)
+        occupied = np.bincount(codes, weights=nights, minlength=len(keys))
+        rooms = np.bincount(codes, minlength=len(keys))
+        return keys, occupied / (rooms * (last - first + 1))
+
+    def dailyOccupancy(
+            self,
+            by: str,
+            start: Day,
+            end: Optional[Day] = None
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        """Get the share of rooms occupied in every group on every day.
+
+        Returns the group keys, the days of the window and a groups by days
+        array of rates, for example to find the peak weeks of every chain.
+        """
+        first, last = self.window(start, end)
+        skip = first % 8
+        unpacked = np.unpackbits(self.windowBits(first, last),
+                                 axis=1)[:, skip:skip + last - first + 1]
+        keys, codes = self.groupRows(by)
+        rooms = np.bincount(codes, minlength=len(keys))
+        occupied = np.zeros((len(keys), last - first + 1))
+        if len(codes):
+            # Rows sorted by group, summed between the first rows of groups.
+            order = np.argsort(codes, kind="stable")
+            occupied = np.add.reduceat(unpacked[order].astype(np.int64),
+                                       np.cumsum(rooms) - rooms,
+                                       axis=0)
+        days = np.arange(first, last + 1) + self.firstDay
+        return keys, days.astype("datetime64[D]"), occupied / rooms[:, None]
+
+    def __str__(self) -> str:
+        """Return string representation of OccupancyCube."""
+        return (f"OccupancyCube({len(self.rids)} rooms, {self.days} days, "
+                f"{self.bits.nbytes} bytes)")
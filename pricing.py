@@ -0,0 +1,166 @@
+"""Seasonal stay pricing for whole arrays of stays at once.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Every night of a stay costs the room price times the
+markup of its chain for the season of that night. Rooms are joined to their
+hotel and chain in memory and the nights of every stay are split by season
+with cumulative day counts, so pricing needs no Python loop over the stays.
+"""
+from typing import Iterable, Tuple
+
+import numpy as np
+
+from availability import dayNumbers
+from record_batch import RecordBatch
+from sanitize import Columns
+
+# Chains markup columns in season order.
+MARKUP_COLUMNS = ("springmkup", "summermkup", "fallmkup", "wintermkup")
+# Season of every month, January first: spring is March to May, summer June
+# to August, fall September to November and winter December to February.
+MONTH_SEASONS = np.array([3, 3, 0, 0, 0, 1, 1, 1, 2, 2, 2, 3], dtype=np.int8)
+
+
+def seasonNights(starts: np.ndarray, ends: np.ndarray) -> np.ndarray:
+    """Count the nights of every stay that fall in each season.
+
+    :param starts Day number of the first night of every stay.
+    :param ends Day number of the departure, which is not charged.
+
+    Returns an array with one row per stay and one column per season.
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    ends = np.maximum(np.asarray(ends, dtype=np.int64), starts)
+    if not len(starts):
+        return np.zeros((0, len(MARKUP_COLUMNS)), dtype=np.int64)
+    first = int(starts.min())
+    days = np.arange(first, int(ends.max()) + 1).astype("datetime64[D]")
+    months = days.astype("datetime64[M]").astype(np.int64) % 12
+    seasons = MONTH_SEASONS[months]
+    # Nights of every season before each day of the covered range.
+    before = np.zeros((len(days) + 1, len(MARKUP_COLUMNS)), dtype=np.int64)
+    before[np.arange(1, len(days) + 1), seasons] = 1
+    before = np.cumsum(before, axis=0)
+    return before[ends - first] - before[starts - first]
+
+
+def lookup(keys: np.ndarray, values: np.ndarray,
+           queries: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the value of every query key, a vectorized dictionary lookup.
+
+    :param keys Unique keys.
+    :param values Value of every key, along the first axis.
+    :param queries Keys to look up.
+
+    Returns the values of the queries, meaningless where a query is not
+    found, and a mask of the queries that were found.
+    """
+    keys = np.asarray(keys)
+    values = np.asarray(values)
+    queries = np.asarray(queries)
+    if not len(keys):
+        return (np.zeros((len(queries), ) + values.shape[1:], values.dtype),
+                np.zeros(len(queries), dtype=bool))
+    order = np.argsort(keys, kind="stable")
+    sortedKeys = keys[order]
+    positions = np.searchsorted(sortedKeys, queries)
+    positions[positions == len(sortedKeys)] = 0
+    found = sortedKeys[positions] == queries
+    return values[order][positions], found
+
+
+class PricingEngine:
+    """Compute season adjusted stay costs for arrays of stays.
+
+    Rooms are joined to Hotel and Chains once, when the engine is built.
+    """
+
+    def __init__(self, rooms: RecordBatch, hotels: RecordBatch,
+                 chains: RecordBatch):
+        """Construct PricingEngine.
+
+        :param rooms Clean Room batch.
+        :param hotels Clean Hotel batch.
+        :param chains Clean Chains batch.
+        """
+        chainMarkups = np.column_stack(
+            [chains[column].astype(np.float64) for column in MARKUP_COLUMNS])
+        hotelChains, hotelFound = lookup(hotels["hid"], hotels["chid"],
+                                         rooms["hid"])
+        markups, chainFound = lookup(chains["chid"], chainMarkups,
+                                     hotelChains)
+        found = hotelFound & chainFound
+        markups[~found] = np.nan
+        self.rids = rooms["rid"].astype(np.int64)
+        self.prices = rooms["rprice"].astype(np.float64)
+        # Markup of every room in season order, NaN when the room's hotel or
+        # chain is missing.
+        self.markups = markups
+
+    @classmethod
+    def fromSources(cls) -> "PricingEngine":
+        """Build the engine from the Room, Hotel and Chains source files."""
+        from data_extraction import (ChainsTableRawData, HotelTableRawData,
+                                     RoomTableRawData)
+        return cls(RoomTableRawData().getCleanBatch(),
+                   HotelTableRawData().getCleanBatch(),
+                   ChainsTableRawData().getCleanBatch())
+
+    def stayCosts(self, rids: Iterable[int], starts: Iterable,
+                  ends: Iterable) -> np.ndarray:
+        """Compute the cost of every stay, NaN for unknown rooms.
+
+        :param rids Room of every stay.
+        :param starts Arrival day of every stay.
+        :param ends Departure day of every stay, its night is not charged.
+        """
+        rids = np.asarray(rids, dtype=np.int64)
+        rates, found = lookup(self.rids,
+                              self.prices[:, None] * self.markups, rids)
+        nights = seasonNights(dayNumbers(starts), dayNumbers(ends))
+        costs = (nights * rates).sum(axis=1)
+        costs[~found] = np.nan
+        return costs
+
+    def priceReservations(self,
+                          reservations: RecordBatch,
+                          unavailable: RecordBatch,
+                          tolerance: float = 0.01) -> Columns:
+        """Price every reservation and compare it with its total_cost.
+
+        :param reservations Clean Reserve batch.
+        :param unavailable Clean RoomUnavailable batch, giving the room and
+        dates of every reservation through ruid.
+        :param tolerance Relative difference allowed between total_cost and
+        the computed cost.
+
+        Returns the reid, total_cost and computed expected_cost of every
+        reservation, with priced False when its room, hotel or chain is
+        missing and mismatch True when total_cost disagrees with the price.
+        """
+        stays = np.column_stack([
+            unavailable["rid"].astype(np.int64),
+            dayNumbers(unavailable["startdate"]),
+            dayNumbers(unavailable["enddate"])
+        ])
+        stays, stayFound = lookup(unavailable["ruid"], stays,
+                                  reservations["ruid"])
+        expected = self.stayCosts(stays[:, 0], stays[:, 1].astype(
+            "datetime64[D]"), stays[:, 2].astype("datetime64[D]"))
+        expected[~stayFound] = np.nan
+        totals = reservations["total_cost"].astype(np.float64)
+        priced = ~np.isnan(expected)
+        mismatch = priced.copy()
+        mismatch[priced] = ~np.isclose(totals[priced], expected[priced],
+                                       rtol=tolerance, atol=0.005)
+        return {
+            "reid": reservations["reid"],
+            "total_cost": totals,
+            "expected_cost": np.round(expected, 2),
+            "priced": priced,
+            "mismatch": mismatch
+        }
+
+    def __str__(self) -> str:
+        """Return string representation of PricingEngine."""
+        return f"PricingEngine({len(self.rids)} rooms)"
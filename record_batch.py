@@ -0,0 +1,230 @@
+"""Columnar record batches for the sanitized table records.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. A RecordBatch holds one typed NumPy array per column of
+a table instead of one Python object per record.
+"""
+import sys
+from datetime import date
+from typing import Iterable, Iterator, List, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+
+from sanitize import Columns
+
+Schema = Sequence[Tuple[str, type]]
+
+COLUMN_DTYPES = {int: np.int64, float: np.float64, bool: np.bool_}
+# Array type of the date columns, missing dates are NaT.
+DATE_DTYPE = "datetime64[D]"
+
+
+def compactColumn(column: np.ndarray) -> np.ndarray:
+    """Downcast an integer column to the smallest type holding its values."""
+    if column.dtype.kind not in "iu" or len(column) == 0:
+        return column
+    return column.astype(
+        np.promote_types(np.min_scalar_type(column.min()),
+                         np.min_scalar_type(column.max())))
+
+
+def internStrings(column: np.ndarray) -> np.ndarray:
+    """Make equal values of an object column share a single object."""
+    if len(column) == 0:
+        return column
+    codes, uniques = pd.factorize(column, use_na_sentinel=False)
+    return np.asarray(uniques, dtype=object)[codes]
+
+
+def typedColumn(column: np.ndarray, columnType: type) -> np.ndarray:
+    """Convert a column to the array type used for columnType.
+
+    Integers use the smallest integer type holding the values, or float64
+    when values are missing. Dates are datetime64 days. Strings and other
+    types are object arrays whose repeated values are shared.
+    """
+    column = np.asarray(column)
+    if columnType is date:
+        return column.astype(DATE_DTYPE)
+    missing = pd.isna(column)
+    if columnType is int and not missing.any():
+        if column.dtype.kind not in "iu":
+            column = column.astype(np.int64)
+        return compactColumn(column)
+    if columnType in (int, float):
+        return column.astype(np.float64)
+    if columnType is bool and not missing.any():
+        return column.astype(np.bool_)
+    if column.dtype != object:
+        column = column.astype(object)
+    if columnType is str:
+        present = ~missing
+        if not all(isinstance(value, str) for value in column[present]):
+            column = column.copy()
+            column[present] = [str(value) for value in column[present]]
+    return internStrings(column)
+
+
+def columnValues(column: np.ndarray) -> list:
+    """Convert a column to Python values with missing values as None."""
+    values = column.tolist()
+    missing = pd.isna(column)
+    if missing.any():
+        for index in np.flatnonzero(missing):
+            values[index] = None
+    return values
+
+
+def coerceColumn(column: np.ndarray, columnType: type) -> list:
+    """Convert a column to Python values of columnType, None when missing."""
+    if columnType is date:
+        # Days convert to datetime.date and NaT to None.
+        return column.astype(DATE_DTYPE).tolist()
+    missing = pd.isna(column)
+    if columnType in COLUMN_DTYPES and not missing.any():
+        return column.astype(COLUMN_DTYPES[columnType]).tolist()
+    return [
+        None if isMissing else columnType(value)
+        for value, isMissing in zip(column.tolist(), missing.tolist())
+    ]
+
+
+class RowView:
+    """Lightweight view of a single row of a RecordBatch.
+
+    Column values are read as attributes, like the *TableData records, but
+    nothing is copied out of the batch.
+    """
+
+    __slots__ = ("batch", "index")
+
+    def __init__(self, batch: "RecordBatch", index: int):
+        """Construct RowView.
+
+        :param batch RecordBatch holding the row.
+        :param index Position of the row in the batch.
+        """
+        self.batch = batch
+        self.index = index
+
+    def __getattr__(self, name: str):
+        """Return the value of column name for this row."""
+        try:
+            return self.batch.getValue(name, self.index)
+        except KeyError:
+            raise AttributeError(name) from None
+
+    def values(self) -> tuple:
+        """Return the values of the row in column order."""
+        return tuple(
+            self.batch.getValue(name, self.index)
+            for name in self.batch.getColumns())
+
+    def __str__(self) -> str:
+        """Return string representation of the row, like the records."""
+        return "-".join(map(str, self.values()))
+
+
+class RecordBatch:
+    """Typed columns of a table, one NumPy array per column."""
+
+    def __init__(self, schema: Schema, columns: Columns):
+        """Construct RecordBatch.
+
+        :param schema (column, type) pairs of the table in column order.
+        :param columns Array of every column in schema, converted to the
+        array type of its column type.
+        """
+        self.schema = tuple(schema)
+        self.columns = {
+            name: typedColumn(columns[name], columnType)
+            for name, columnType in self.schema
+        }
+
+    @classmethod
+    def fromTyped(cls, schema: Schema, columns: Columns) -> "RecordBatch":
+        """Construct a RecordBatch from columns that are already typed."""
+        batch = cls.__new__(cls)
+        batch.schema = tuple(schema)
+        batch.columns = {name: columns[name] for name, _ in batch.schema}
+        return batch
+
+    @classmethod
+    def concat(cls, schema: Schema,
+               batches: Iterable["RecordBatch"]) -> "RecordBatch":
+        """Concatenate batches of the same table into a single batch."""
+        batches = list(batches)
+        if not batches:
+            return cls(schema, {name: np.empty(0) for name, _ in schema})
+        return cls(
+            schema, {
+                name: np.concatenate(
+                    [batch.columns[name] for batch in batches])
+                for name, _ in schema
+            })
+
+    def getColumns(self) -> List[str]:
+        """Get the column names in column order."""
+        return [name for name, _ in self.schema]
+
+    def getValue(self, name: str, index: int):
+        """Get the value of column name at index as a Python value."""
+        value = self.columns[name][index]
+        return value.item() if isinstance(value, np.generic) else value
+
+    def __len__(self) -> int:
+        """Return the number of rows in the batch."""
+        return len(next(iter(self.columns.values()), ()))
+
+    def __iter__(self) -> Iterator[RowView]:
+        """Iterate over a view of every row."""
+        return (RowView(self, index) for index in range(len(self)))
+
+    def __getitem__(
+        self, key: Union[str, int, slice, np.ndarray]
+    ) -> Union[np.ndarray, RowView, "RecordBatch"]:
+        """Get a column by name, a row view by position or a sub batch.
+
+        Slices, boolean masks and index arrays return a new RecordBatch.
+        """
+        if isinstance(key, str):
+            return self.columns[key]
+        if isinstance(key, (int, np.integer)):
+            if not -len(self) <= key < len(self):
+                raise IndexError(key)
+            return RowView(self, int(key) % len(self))
+        return RecordBatch.fromTyped(
+            self.schema,
+            {name: column[key]
+             for name, column in self.columns.items()})
+
+    def rows(self) -> Iterator[tuple]:
+        """Get the rows as tuples of Python values of the column types."""
+        return zip(*(coerceColumn(self.columns[name], columnType)
+                     for name, columnType in self.schema))
+
+    def toRecords(self, recordClass: type) -> list:
+        """Build a recordClass object for every row of the batch."""
+        values = [columnValues(self.columns[name]) for name, _ in self.schema]
+        return [recordClass(*row) for row in zip(*values)]
+
+    def toDataFrame(self) -> pd.DataFrame:
+        """Return the batch as a DataFrame sharing the column arrays."""
+        return pd.DataFrame(self.columns, copy=False)
+
+    @property
+    def nbytes(self) -> int:
+        """Return the memory used by the columns and their shared objects."""
+        total = 0
+        for column in self.columns.values():
+            total += column.nbytes
+            if column.dtype == object:
+                total += sum(
+                    sys.getsizeof(value)
+                    for value in pd.unique(column))
+        return total
+
+    def __str__(self) -> str:
+        """Return string representation of RecordBatch."""
+        return f"RecordBatch({len(self)} rows, {', '.join(self.getColumns())})"
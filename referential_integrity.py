@@ -0,0 +1,190 @@
+"""In-memory foreign key check of the sanitized batches before loading.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. The keys of every referenced table are put in a hash set
+and the foreign key column of every referencing batch is probed against it,
+so orphan rows are found before any row is sent to the database, where a
+single orphan would abort the COPY of its whole table. Orphans are either
+reported or quarantined, that is removed from their batch and kept aside.
+"""
+import os
+from typing import Dict, List, Mapping, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from data_extraction import TableRawData
+from database import FOREIGN_KEYS, DatabaseSession
+from record_batch import RecordBatch
+
+# Orphans are reported and the load is stopped before its first insert.
+REPORT = "report"
+# Orphans are removed from their batch and kept in the validator.
+QUARANTINE = "quarantine"
+POLICIES = (REPORT, QUARANTINE)
+# Number of orphan keys shown in the report of a relationship.
+SAMPLE_KEYS = 5
+
+ForeignKey = Tuple[str, str, str, str]
+
+
+def orphanMask(values: np.ndarray, parentKeys: np.ndarray) -> np.ndarray:
+    """Return True for every value missing from parentKeys.
+
+    Missing values reference nothing, like in the database, and are never
+    orphans.
+    """
+    keys = pd.Index(values)
+    return ~(keys.isin(parentKeys) | keys.isna())
+
+
+class Orphans:
+    """Class used to represent the orphan rows of a single foreign key."""
+
+    def __init__(self, child: str, column: str, parent: str,
+                 parentColumn: str):
+        """Construct Orphans.
+
+        :param child Table holding the foreign key column.
+        :param column Foreign key column of child.
+        :param parent Table referenced by column.
+        :param parentColumn Column of parent referenced by column.
+        """
+        self.child = child
+        self.column = column
+        self.parent = parent
+        self.parentColumn = parentColumn
+        self.count = 0
+        self.keys = np.empty(0)
+
+    def add(self, keys: np.ndarray):
+        """Count orphan rows, keys being their foreign key values."""
+        self.count += len(keys)
+        if len(self.keys):
+            keys = np.concatenate([self.keys, keys])
+        self.keys = np.sort(pd.unique(keys))
+
+    def getLabel(self) -> str:
+        """Get the name the quarantined rows are counted under."""
+        return (f"References({self.column}, "
+                f"{self.parent}.{self.parentColumn})")
+
+    def __str__(self) -> str:
+        """Return string representation of Orphans."""
+        sample = ", ".join(str(key) for key in self.keys[:SAMPLE_KEYS])
+        more = ", ..." if len(self.keys) > SAMPLE_KEYS else ""
+        return (f"{self.child}.{self.column} -> {self.parent}."
+                f"{self.parentColumn}: {self.count} orphan rows, "
+                f"{len(self.keys)} missing keys ({sample}{more})")
+
+
+class ReferentialValidator:
+    """Hash set check of the foreign keys of the loaded batches.
+
+    The validator keeps the rows it quarantined until the next validation,
+    and writes them as one csv file per table when given a directory.
+    """
+
+    def __init__(self,
+                 policy: str = REPORT,
+                 directory: Optional[str] = None,
+                 foreignKeys: Tuple[ForeignKey, ...] = FOREIGN_KEYS):
+        """Construct ReferentialValidator.
+
+        :param policy REPORT or QUARANTINE.
+        :param directory Directory the quarantined rows are written to,
+        they are only kept in memory when omitted.
+        :param foreignKeys Relationships checked as (child, column, parent,
+        parentColumn) tuples.
+        """
+        if policy not in POLICIES:
+            raise ValueError(f"Invalid orphan policy: {policy}")
+        self.policy = policy
+        self.directory = directory
+        self.foreignKeys = foreignKeys
+        self.quarantined: Dict[str, List[RecordBatch]] = {}
+
+    def getParentKeys(self, parent: str, parentColumn: str,
+                      loaded: Mapping[str, TableRawData],
+                      conn: Optional[DatabaseSession]) -> Optional[np.ndarray]:
+        """Get the keys of a referenced table, None if they are unknown.
+
+        Keys come from the clean batch of parent when it is loaded too,
+        otherwise from the rows conn already holds.
+        """
+        if parent in loaded:
+            return loaded[parent].getCleanBatch()[parentColumn]
+        if conn is None:
+            return None
+        conn.cursor.execute(f"SELECT DISTINCT {parentColumn} FROM {parent};")
+        return np.array([row[0] for row in conn.cursor.fetchall()])
+
+    def validate(self,
+                 loaded: Mapping[str, TableRawData],
+                 conn: Optional[DatabaseSession] = None) -> List[Orphans]:
+        """Check the foreign keys of the loaded tables and print the orphans.
+
+        :param loaded Sanitized loaders keyed by table name.
+        :param conn Session the keys of referenced tables that are not
+        loaded are read from. Such relationships are skipped when omitted.
+
+        Under QUARANTINE the check is repeated until no row is removed,
+        since removing a row orphans the rows referencing it. Returns the
+        orphans of every relationship that has any, under REPORT any orphan
+        raises a ValueError instead.
+        """
+        self.quarantined = {}
+        found: Dict[ForeignKey, Orphans] = {}
+        stored: Dict[Tuple[str, str], Optional[np.ndarray]] = {}
+        removed = True
+        while removed:
+            removed = False
+            for foreignKey in self.foreignKeys:
+                child, column, parent, parentColumn = foreignKey
+                if child not in loaded:
+                    continue
+                # Keys read from the database are only read once.
+                if parent in loaded or (parent, parentColumn) not in stored:
+                    stored[parent, parentColumn] = self.getParentKeys(
+                        parent, parentColumn, loaded, conn)
+                parentKeys = stored[parent, parentColumn]
+                if parentKeys is None:
+                    continue
+                values = loaded[child].getCleanBatch()[column]
+                mask = orphanMask(values, parentKeys)
+                if not mask.any():
+                    continue
+                orphans = found.setdefault(foreignKey, Orphans(*foreignKey))
+                orphans.add(values[mask])
+                if self.policy == QUARANTINE:
+                    self.quarantined.setdefault(child, []).append(
+                        loaded[child].dropRows(mask, orphans.getLabel()))
+                    removed = True
+        for orphans in found.values():
+            print(f"{'Quarantined' if self.policy == QUARANTINE else 'Found'}"
+                  f" {orphans}")
+        if self.policy == REPORT and found:
+            raise ValueError(f"{sum(o.count for o in found.values())} rows "
+                             "reference missing keys, nothing was loaded")
+        if self.directory is not None and self.quarantined:
+            self.writeQuarantine(self.directory)
+        return list(found.values())
+
+    def getQuarantined(self, table: str) -> Optional[RecordBatch]:
+        """Get the rows of table quarantined by the last validation."""
+        batches = self.quarantined.get(table)
+        if not batches:
+            return None
+        return RecordBatch.concat(batches[0].schema, batches)
+
+    def writeQuarantine(self, directory: str):
+        """Write the quarantined rows of every table to directory/table.csv."""
+        os.makedirs(directory, exist_ok=True)
+        for table in self.quarantined:
+            self.getQuarantined(table).toDataFrame().to_csv(
+                os.path.join(directory, f"{table}.csv"), index=False)
+
+    def __str__(self) -> str:
+        """Return string representation of ReferentialValidator."""
+        return (f"ReferentialValidator({self.policy}, "
+                f"{len(self.foreignKeys)} foreign keys)")
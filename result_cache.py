@@ -0,0 +1,71 @@
+"""Query result cache with least recently used and time based eviction.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Dashboard queries are answered from the cache while
+their result is fresh so repeated requests don't reach the database.
+"""
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Hashable, Tuple, TypeVar
+
+T = TypeVar("T")
+
+
+class ResultCache:
+    """Thread-safe cache of at most maxSize results, each kept ttl seconds.
+
+    The least recently used result is evicted when the cache is full.
+    """
+
+    def __init__(self, maxSize: int = 256, ttl: float = 60.0):
+        """Construct ResultCache.
+
+        :param maxSize Largest number of results kept.
+        :param ttl Seconds a result is served after it is computed.
+        """
+        if maxSize < 1:
+            raise ValueError(f"Invalid cache size: {maxSize}")
+        self.maxSize = maxSize
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries: "OrderedDict[Hashable, Tuple[float, object]]" = (
+            OrderedDict())
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key: Hashable, compute: Callable[[], T]) -> T:
+        """Get the result of key, calling compute when it is missing or stale.
+
+        compute runs without holding the lock, so concurrent misses of the
+        same key may compute it more than once.
+        """
+        now = time.monotonic()
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None and entry[0] > now:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        result = compute()
+        with self.lock:
+            self.entries[key] = (time.monotonic() + self.ttl, result)
+            self.entries.move_to_end(key)
+            while len(self.entries) > self.maxSize:
+                self.entries.popitem(last=False)
+        return result
+
+    def clear(self):
+        """Evict every result, for example once the data has changed."""
+        with self.lock:
+            self.entries.clear()
+
+    def __len__(self) -> int:
+        """Return the number of results in the cache, stale ones included."""
+        return len(self.entries)
+
+    def __str__(self) -> str:
+        """Return string representation of ResultCache."""
+        return (f"ResultCache({len(self)}/{self.maxSize} results, "
+                f"{self.hits} hits, {self.misses} misses)")
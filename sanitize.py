@@ -0,0 +1,236 @@
+"""Vectorized sanitization rules for the parsed source columns.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Every rule evaluates a whole column at once and returns
+a boolean mask of the rows that satisfy it. Rules with an SQL form can also
+be pushed into the queries of the sqlite sources.
+"""
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+Columns = Dict[str, np.ndarray]
+
+
+class Rule:
+    """Base class of a sanitization rule over a single column."""
+
+    def __init__(self, column: str):
+        """Construct Rule.
+
+        :param column Name of the column checked by the rule.
+        """
+        self.column = column
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Return True for every value that satisfies the rule."""
+        raise NotImplementedError
+
+    def evaluate(self, columns: Columns) -> np.ndarray:
+        """Return True for every row of columns that satisfies the rule."""
+        return self.mask(columns[self.column])
+
+    def sql(self) -> Optional[str]:
+        """Return the rule as an SQL condition, None if it has none.
+
+        Like the rules, the conditions reject missing values (NULL).
+        """
+        return None
+
+    def __str__(self) -> str:
+        """Return string representation of the Rule."""
+        return f"{type(self).__name__}({self.column})"
+
+
+class NotNull(Rule):
+    """Rule rejecting missing values (None or NaN)."""
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Return True for every value that is present."""
+        return ~pd.isna(values)
+
+    def sql(self) -> str:
+        """Return the rule as an SQL condition."""
+        return f"{self.column} IS NOT NULL"
+
+
+class NonEmpty(Rule):
+    """Rule rejecting missing values and empty strings."""
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Return True for every value that is present and not empty."""
+        present = ~pd.isna(values)
+        present[present] = values[present] != ""
+        return present
+
+    def sql(self) -> str:
+        """Return the rule as an SQL condition."""
+        return f"{self.column} IS NOT NULL AND {self.column} <> ''"
+
+
+class AtLeast(Rule):
+    """Rule rejecting missing values and values below a minimum."""
+
+    def __init__(self, column: str, minimum: float):
+        """Construct AtLeast.
+
+        :param column Name of the column checked by the rule.
+        :param minimum Smallest accepted value.
+        """
+        super().__init__(column)
+        self.minimum = minimum
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Return True for every value greater than or equal to minimum."""
+        present = ~pd.isna(values)
+        present[present] = values[present] >= self.minimum
+        return present
+
+    def sql(self) -> str:
+        """Return the rule as an SQL condition."""
+        return f"{self.column} >= {self.minimum!r}"
+
+    def __str__(self) -> str:
+        """Return string representation of AtLeast."""
+        return f"AtLeast({self.column}, {self.minimum})"
+
+
+class GreaterThan(Rule):
+    """Rule rejecting missing values and values up to a bound."""
+
+    def __init__(self, column: str, bound: float):
+        """Construct GreaterThan.
+
+        :param column Name of the column checked by the rule.
+        :param bound Largest rejected value.
+        """
+        super().__init__(column)
+        self.bound = bound
+
+    def mask(self, values: np.ndarray) -> np.ndarray:
+        """Return True for every value strictly greater than bound."""
+        present = ~pd.isna(values)
+        present[present] = values[present] > self.bound
+        return present
+
+    def sql(self) -> str:
+        """Return the rule as an SQL condition."""
+        return f"{self.column} > {self.bound!r}"
+
+    def __str__(self) -> str:
+        """Return string representation of GreaterThan."""
+        return f"GreaterThan({self.column}, {self.bound})"
+
+
+class NotBefore(Rule):
+    """Rule rejecting rows whose value comes before another column's value.
+
+    Used for ranges like startdate to enddate, rows missing either value
+    are rejected as well.
+    """
+
+    def __init__(self, column: str, other: str):
+        """Construct NotBefore.
+
+        :param column Name of the column holding the end of the range.
+        :param other Name of the column holding the start of the range.
+        """
+        super().__init__(column)
+        self.other = other
+
+    def evaluate(self, columns: Columns) -> np.ndarray:
+        """Return True for every row where column is not before other."""
+        values, others = columns[self.column], columns[self.other]
+        present = ~(pd.isna(values) | pd.isna(others))
+        present[present] = values[present] >= others[present]
+        return present
+
+    def __str__(self) -> str:
+        """Return string representation of NotBefore."""
+        return f"NotBefore({self.column}, {self.other})"
+
+
+# Policies for rows sharing a primary key, as the keep argument of
+# pandas.Index.duplicated: keep the first or last row, or reject them all.
+KEEP_FIRST = "first"
+KEEP_LAST = "last"
+REJECT_ALL = "reject"
+DUPLICATE_POLICIES = {KEEP_FIRST: "first", KEEP_LAST: "last",
+                      REJECT_ALL: False}
+
+
+def duplicateKeys(keys: np.ndarray,
+                  policy: str = KEEP_FIRST) -> Tuple[np.ndarray, np.ndarray]:
+    """Find the rows of keys sharing their key with another row.
+
+    Keys are hashed once, by a pandas Index. Returns True for every row
+    rejected by policy and the distinct keys shared by several rows.
+    """
+    if policy not in DUPLICATE_POLICIES:
+        raise ValueError(f"Invalid duplicate key policy: {policy}")
+    index = pd.Index(keys)
+    if index.is_unique:
+        return np.zeros(len(keys), dtype=bool), keys[:0]
+    shared = index.duplicated(keep=False)
+    return (index.duplicated(keep=DUPLICATE_POLICIES[policy]),
+            pd.unique(keys[shared]))
+
+
+class SortedKeys:
+    """Set of keys added chunk by chunk, kept as sorted runs.
+
+    A run is only merged into the previous one once it is at least as
+    large, like the digits of a binary counter, so adding n keys sorts
+    every key O(log n) times in total and a lookup binary searches
+    O(log n) runs. Nothing is hashed again as the set grows.
+    """
+
+    def __init__(self):
+        """Construct an empty SortedKeys."""
+        self.runs: List[np.ndarray] = []
+
+    def contains(self, keys: np.ndarray) -> np.ndarray:
+        """Return True for every value of keys already in the set."""
+        # Searching sorted keys walks every run in order, which keeps the
+        # lookups of large runs in cache.
+        order = np.argsort(keys, kind="stable")
+        ordered = keys[order]
+        found = np.zeros(len(keys), dtype=bool)
+        for run in self.runs:
+            positions = np.minimum(np.searchsorted(run, ordered),
+                                   len(run) - 1)
+            found[order] |= run[positions] == ordered
+        return found
+
+    def add(self, keys: np.ndarray):
+        """Add keys, which must not be in the set yet."""
+        run = np.sort(keys)
+        while self.runs and len(self.runs[-1]) <= len(run):
+            # The stable sort merges two sorted runs in linear time.
+            run = np.sort(np.concatenate([self.runs.pop(), run]),
+                          kind="stable")
+        self.runs.append(run)
+
+    def __len__(self) -> int:
+        """Return the number of keys in the set."""
+        return sum(len(run) for run in self.runs)
+
+
+def sanitizeColumns(columns: Columns,
+                    rules: Iterable[Rule]) -> Tuple[Columns, Dict[str, int]]:
+    """Keep the rows of columns that satisfy every rule.
+
+    Returns the clean columns and the number of rows rejected by each rule.
+    A row failing several rules is counted by the first one only.
+    """
+    rows = len(next(iter(columns.values()), ()))
+    keep = np.ones(rows, dtype=bool)
+    rejected = {}
+    for rule in rules:
+        passed = rule.evaluate(columns)
+        rejected[str(rule)] = int(np.count_nonzero(keep & ~passed))
+        keep &= passed
+    if keep.all():
+        return columns, rejected
+    return {name: column[keep] for name, column in columns.items()}, rejected
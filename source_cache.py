@@ -0,0 +1,184 @@
+"""Cache of the sanitized source columns, memory mapped on later loads.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. The clean columns of every loader are saved as NumPy
+.npy files next to a manifest holding the hash of the source file they came
+from. Loads of an unchanged source map the files instead of parsing and
+sanitizing the source again, a changed source replaces its entry.
+"""
+import hashlib
+import json
+import os
+import threading
+from typing import Dict, Optional, Tuple, Type
+
+import numpy as np
+
+from data_extraction import Columns, TableRawData
+
+# Bump whenever the layout of the cache changes.
+CACHE_VERSION = 1
+HASH_BLOCK_SIZE = 1 << 20
+
+
+def fileDigest(path: str) -> str:
+    """Return the SHA-256 of the contents of the file at path."""
+    digest = hashlib.sha256()
+    with open(path, "rb") as file:
+        for block in iter(lambda: file.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class SourceCache:
+    """Directory of clean columns keyed by source hash and loader.
+
+    Entries are also keyed by the schema and sanitize rules of the loader,
+    so changing either rebuilds the entry. String columns are saved as
+    fixed width unicode arrays so every column can be memory mapped.
+    """
+
+    DIRECTORY = ".source_cache"
+
+    def __init__(self, directory: str = DIRECTORY):
+        """Construct SourceCache.
+
+        :param directory Directory holding one subdirectory per table,
+        created when missing.
+        """
+        self.directory = directory
+        self.lock = threading.Lock()
+        # Hash of every source by path, reused while its size and
+        # modification time stay the same.
+        self.digests: Dict[str, Tuple[int, int, str]] = {}
+
+    def sourceDigest(self, path: str) -> str:
+        """Get the hash of a source file, hashing it only when it changed."""
+        stat = os.stat(path)
+        with self.lock:
+            known = self.digests.get(path)
+        if known is not None and known[:2] == (stat.st_size,
+                                               stat.st_mtime_ns):
+            return known[2]
+        digest = fileDigest(path)
+        with self.lock:
+            self.digests[path] = (stat.st_size, stat.st_mtime_ns, digest)
+        return digest
+
+    def getKey(self, loader: Type[TableRawData]) -> str:
+        """Get the key of the current entry of loader.
+
+        The key covers everything that changes the clean columns: the source
+        contents and how they are read, typed and sanitized.
+        """
+        digest = hashlib.sha256()
+        for part in (CACHE_VERSION, loader.__module__, loader.__qualname__,
+                     os.path.abspath(loader.SOURCE), loader.SCHEMA,
+                     sorted(loader.SOURCE_COLUMNS.items()),
+                     loader.DATE_FORMAT, getattr(loader, "QUERY", None),
+                     [str(rule) for rule in loader.getSanitizeRules()],
+                     loader.DUPLICATE_POLICY,
+                     self.sourceDigest(loader.SOURCE)):
+            digest.update(repr(part).encode("utf-8"))
+        return digest.hexdigest()
+
+    def getPath(self, loader: Type[TableRawData], name: str) -> str:
+        """Get the path of a file of the entry of loader."""
+        return os.path.join(self.directory, loader.TABLE, name)
+
+    def readManifest(self, loader: Type[TableRawData]) -> Optional[dict]:
+        """Get the manifest of the entry of loader, None if it has none."""
+        try:
+            with open(self.getPath(loader, "manifest.json"),
+                      encoding="utf-8") as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            return None
+
+    def isCurrent(self, loader: Type[TableRawData]) -> bool:
+        """Check if the entry of loader matches its source file."""
+        manifest = self.readManifest(loader)
+        return manifest is not None and manifest["key"] == self.getKey(loader)
+
+    def load(self, loader: Type[TableRawData]) -> Optional[TableRawData]:
+        """Get loader built from its memory mapped entry.
+
+        Returns None when the entry is missing or stale, or its files can't
+        be read.
+        """
+        manifest = self.readManifest(loader)
+        if manifest is None or manifest["key"] != self.getKey(loader):
+            return None
+        try:
+            columns = {
+                name: np.load(self.getPath(loader, fileName), mmap_mode="r")
+                for name, fileName in manifest["columns"].items()
+            }
+        except (OSError, ValueError):
+            return None
+        return loader(columns, manifest["rejected"])
+
+    def store(self, loaded: TableRawData):
+        """Replace the entry of a loader with its clean columns.
+
+        Column files are named after the key and the manifest is replaced
+        last, so readers see either the old or the new entry. Files of the
+        old entry are removed afterwards.
+        """
+        loader = type(loaded)
+        key = self.getKey(loader)
+        os.makedirs(os.path.join(self.directory, loader.TABLE), exist_ok=True)
+        files = {}
+        for name, column in loaded.getCleanColumns().items():
+            if column.dtype == object:
+                column = column.astype(str)
+            files[name] = f"{name}-{key[:16]}.npy"
+            np.save(self.getPath(loader, files[name]), column,
+                    allow_pickle=False)
+        manifest = self.getPath(loader, "manifest.json")
+        temporary = f"{manifest}.{os.getpid()}.{threading.get_ident()}"
+        with open(temporary, "w", encoding="utf-8") as file:
+            json.dump({
+                "key": key,
+                "source": loader.SOURCE,
+                "columns": files,
+                "rejected": loaded.rejected
+            }, file, indent=4)
+        os.replace(temporary, manifest)
+        for name in os.listdir(os.path.join(self.directory, loader.TABLE)):
+            if name.endswith(".npy") and name not in files.values():
+                try:
+                    os.remove(self.getPath(loader, name))
+                except OSError:
+                    # Still mapped by a reader on some platforms.
+                    pass
+
+    def getOrLoad(self, loader: Type[TableRawData],
+                  columns: Optional[Columns] = None) -> TableRawData:
+        """Get loader from the cache, building and storing it on a miss.
+
+        :param columns Columns already parsed from the source, read from
+        the source on a miss when omitted.
+        """
+        loaded = self.load(loader)
+        if loaded is None:
+            loaded = loader(columns)
+            self.store(loaded)
+        return loaded
+
+    def clear(self, loader: Optional[Type[TableRawData]] = None):
+        """Remove the entry of loader, or every entry when omitted."""
+        tables = ([loader.TABLE] if loader is not None else
+                  os.listdir(self.directory)
+                  if os.path.isdir(self.directory) else [])
+        for table in tables:
+            entry = os.path.join(self.directory, table)
+            if not os.path.isdir(entry):
+                continue
+            for name in os.listdir(entry):
+                os.remove(os.path.join(entry, name))
+            os.rmdir(entry)
+
+    def __str__(self) -> str:
+        """Return string representation of SourceCache."""
+        return f"SourceCache({self.directory})"
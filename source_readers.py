@@ -0,0 +1,166 @@
+"""Incremental readers for the sqlite, json and xlsx source files.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. The readers yield records a few at a time so loaders can
+process sources that do not fit in memory.
+"""
+import json
+import os
+import re
+import sqlite3
+from contextlib import closing
+from itertools import islice
+from typing import Iterable, Iterator, List, TypeVar
+from urllib.request import pathname2url
+
+import openpyxl
+
+T = TypeVar("T")
+
+WHITESPACE = re.compile(r"\s*")
+# Characters a JSON number may still continue with.
+NUMBER_TAIL = re.compile(r"[\d.eE+-]*")
+# Bytes of a sqlite source read through mmap and KiB of pages cached.
+SQLITE_MMAP_BYTES = 1 << 30
+SQLITE_CACHE_KIB = 1 << 16
+
+
+def chunked(items: Iterable[T], chunkSize: int) -> Iterator[List[T]]:
+    """Split items into lists of at most chunkSize items."""
+    iterator = iter(items)
+    while True:
+        chunk = list(islice(iterator, chunkSize))
+        if not chunk:
+            return
+        yield chunk
+
+
+def openSqliteSource(path: str) -> sqlite3.Connection:
+    """Open the sqlite file at path as an immutable, read only database.
+
+    sqlite then takes no locks and never checks the file for changes, so
+    the file must not change while it is open. Pages are read through mmap
+    and up to SQLITE_CACHE_KIB of them stay cached.
+    """
+    conn = sqlite3.connect(
+        f"file:{pathname2url(os.path.abspath(path))}?mode=ro&immutable=1",
+        uri=True)
+    conn.execute(f"PRAGMA mmap_size = {SQLITE_MMAP_BYTES};")
+    conn.execute(f"PRAGMA cache_size = -{SQLITE_CACHE_KIB};")
+    return conn
+
+
+def querySqliteRow(path: str, query: str) -> tuple:
+    """Return the first row returned by query, like an aggregate."""
+    with closing(openSqliteSource(path)) as conn:
+        return conn.execute(query).fetchone()
+
+
+def iterSqliteChunks(path: str, query: str,
+                     chunkSize: int) -> Iterator[List[tuple]]:
+    """Yield the rows returned by query in lists of at most chunkSize rows."""
+    with closing(openSqliteSource(path)) as conn:
+        cursor = conn.execute(query)
+        while True:
+            rows = cursor.fetchmany(chunkSize)
+            if not rows:
+                return
+            yield rows
+
+
+def iterJsonArray(path: str, bufferSize: int = 1 << 16) -> Iterator[dict]:
+    """Yield the elements of a top level JSON array one at a time.
+
+    Only bufferSize characters plus the element being decoded are held in
+    memory, no matter how large the file is.
+    """
+    decoder = json.JSONDecoder()
+    with open(path, encoding="utf-8") as file:
+        buffer = ""
+        position = 0
+        eof = False
+
+        def fill():
+            nonlocal buffer, position, eof
+            data = file.read(bufferSize)
+            eof = not data
+            buffer = buffer[position:] + data
+            position = 0
+
+        def skip():
+            """Skip whitespace, reading as needed."""
+            nonlocal position
+            while True:
+                position = WHITESPACE.match(buffer, position).end()
+                if position < len(buffer) or eof:
+                    return
+                fill()
+
+        def nextCharacter() -> str:
+            """Skip whitespace and return the next character of the array."""
+            skip()
+            if position >= len(buffer):
+                raise ValueError(f"{path} ends inside of the JSON array")
+            return buffer[position]
+
+        skip()
+        if buffer[position:position + 1] != "[":
+            raise ValueError(f"{path} does not contain a JSON array")
+        position += 1
+        if nextCharacter() == "]":
+            return
+        while True:
+            if buffer[position] in ",]":
+                raise ValueError(f"{path} has an empty JSON array element at "
+                                 f"{buffer[position:position + 20]!r}")
+            try:
+                element, end = decoder.raw_decode(buffer, position)
+            except json.JSONDecodeError:
+                if eof:
+                    raise
+                fill()
+                continue
+            if (not eof and isinstance(element, (int, float))
+                    and NUMBER_TAIL.match(buffer, end).end() == len(buffer)):
+                # A number may continue in the next read, like 1. or 5e,
+                # decode it again.
+                fill()
+                continue
+            position = end
+            yield element
+            separator = nextCharacter()
+            if separator == "]":
+                return
+            if separator != ",":
+                raise ValueError(f"{path} has no comma between JSON array "
+                                 f"elements at "
+                                 f"{buffer[position:position + 20]!r}")
+            position += 1
+            nextCharacter()
+
+
+def iterXlsxRows(path: str) -> Iterator[tuple]:
+    """Yield the rows of the first sheet of a workbook as value tuples.
+
+    The workbook is opened in read-only mode, which parses the sheet as it
+    is iterated instead of building every cell first, so memory use does
+    not grow with the size of the sheet. The header is the first row and,
+    like pandas.read_excel, empty rows at the end of the sheet are skipped.
+    """
+    workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+    try:
+        sheet = workbook.worksheets[0]
+        # The stored dimensions may be wrong, read every row that is there.
+        sheet.reset_dimensions()
+        # Empty rows are held back until a row with values follows them.
+        empty = 0
+        for row in sheet.iter_rows(values_only=True):
+            if all(value is None for value in row):
+                empty += 1
+                continue
+            for _ in range(empty):
+                yield (None, ) * len(row)
+            empty = 0
+            yield row
+    finally:
+        workbook.close()
@@ -0,0 +1,153 @@
+"""Synthetic source files at any multiple of the Raw_Data fixtures.
+
+This module was developed for the term project - Hotel Analytics Systems for
+CIIC4060/ICOM 5016. Every table of the fixtures is repeated scale times and
+the keys of every copy are shifted past the keys of the previous copies, the
+foreign keys by the same amount as the keys they reference, so the generated
+sources are as dirty and as referentially consistent as the originals. Run
+``python synthetic_data.py directory [scale]`` to write them to directory.
+"""
+import os
+import sqlite3
+import sys
+from contextlib import closing
+from typing import Dict, Iterable, Type
+
+import numpy as np
+import pandas as pd
+
+from data_extraction import Columns, TableRawData
+from database import FOREIGN_KEYS
+from load_orchestrator import LOADERS
+
+# Largest scale factor the generator accepts.
+MAX_SCALE = 1000
+
+
+def keySpans(sources: Dict[str, Columns]) -> Dict[str, int]:
+    """Get the largest primary key of every table, the shift of a copy."""
+    return {
+        loader.TABLE: int(np.nanmax(
+            sources[loader.TABLE][loader.PRIMARY_KEY].astype(np.float64)))
+        for loader in LOADERS
+    }
+
+
+def scaleColumns(loader: Type[TableRawData], columns: Columns,
+                 spans: Dict[str, int], scale: int) -> Columns:
+    """Repeat columns scale times, shifting the keys of every copy.
+
+    Missing and non positive keys, like the -1 of the administrative hotel,
+    are repeated unchanged, except that rows with a non positive primary key
+    are only kept in the first copy.
+    """
+    shifts = {loader.PRIMARY_KEY: spans[loader.TABLE]}
+    shifts.update({
+        column: spans[parent]
+        for child, column, parent, _ in FOREIGN_KEYS if child == loader.TABLE
+    })
+    rows = len(columns[loader.PRIMARY_KEY])
+    copies = np.repeat(np.arange(scale, dtype=np.int64), rows)
+    primaryKeys = np.tile(columns[loader.PRIMARY_KEY].astype(np.float64),
+                          scale)
+    keep = (copies == 0) | ~(primaryKeys <= 0)
+    copies = copies[keep]
+    scaled = {}
+    for name, column in columns.items():
+        column = np.tile(column, scale)[keep]
+        if name in shifts:
+            keys = column.astype(np.float64)
+            shifted = keys > 0
+            keys[shifted] += copies[shifted] * shifts[name]
+            column = pd.array(keys, dtype="Int64")
+        scaled[name] = column
+    return scaled
+
+
+def sourceColumn(loader: Type[TableRawData], column) -> object:
+    """Convert a parsed column back to the values of its source file.
+
+    Booleans are written as 0 and 1 and dates in the DATE_FORMAT of loader.
+    """
+    if column.dtype == bool:
+        return column.astype(np.int64)
+    if column.dtype.kind == "M":
+        return pd.Series(column).dt.strftime(loader.DATE_FORMAT)
+    return column
+
+
+def sourceFrame(loader: Type[TableRawData], columns: Columns) -> pd.DataFrame:
+    """Build the DataFrame of a source file, named like its columns."""
+    return pd.DataFrame({
+        loader.SOURCE_COLUMNS.get(name, name): sourceColumn(loader, column)
+        for name, column in columns.items()
+    })
+
+
+def writeSource(loader: Type[TableRawData], columns: Columns, path: str):
+    """Write columns to path in the format of the source of loader."""
+    df = sourceFrame(loader, columns)
+    extension = os.path.splitext(path)[1]
+    if extension == ".csv":
+        df.to_csv(path, index=False)
+    elif extension == ".json":
+        df.to_json(path, orient="records", indent=4, force_ascii=False)
+    elif extension == ".xlsx":
+        df.to_excel(path, index=False)
+    elif extension == ".db":
+        # The sqlite sources are read with QUERY, from the table it names.
+        table = loader.QUERY.split()[-1]
+        if os.path.exists(path):
+            os.remove(path)
+        with closing(sqlite3.connect(path)) as conn:
+            df.astype(object).where(df.notna(), None).to_sql(
+                table, conn, index=False)
+    else:
+        raise ValueError(f"Unknown source format: {path}")
+
+
+def generateSources(directory: str,
+                    scale: int = 1,
+                    loaders: Iterable[Type[TableRawData]] = LOADERS
+                    ) -> Dict[str, Type[TableRawData]]:
+    """Write the sources of every loader scale times larger to directory.
+
+    :param directory Directory the source files are written to, created
+    when missing. Files are named like the Raw_Data files.
+    :param scale Number of copies of the fixtures, from 1 to MAX_SCALE.
+    :param loaders Loaders whose sources are generated.
+
+    Returns the loaders reading the generated files, see sourceLoaders.
+    """
+    if not 1 <= scale <= MAX_SCALE:
+        raise ValueError(f"Scale must be from 1 to {MAX_SCALE}: {scale}")
+    loaders = list(loaders)
+    os.makedirs(directory, exist_ok=True)
+    sources = {loader.TABLE: loader.readColumns() for loader in LOADERS}
+    spans = keySpans(sources)
+    for loader in loaders:
+        columns = scaleColumns(loader, sources[loader.TABLE], spans, scale)
+        writeSource(loader, columns,
+                    os.path.join(directory, os.path.basename(loader.SOURCE)))
+    return sourceLoaders(directory, loaders)
+
+
+def sourceLoaders(directory: str,
+                  loaders: Iterable[Type[TableRawData]] = LOADERS
+                  ) -> Dict[str, Type[TableRawData]]:
+    """Get subclasses of loaders reading their source from directory.
+
+    The subclasses can be given to LoadOrchestrator or DeltaLoader, but not
+    parsed in a process pool since they are not importable.
+    """
+    return {
+        loader.TABLE: type(loader.__name__, (loader, ), {
+            "SOURCE": os.path.join(directory,
+                                   os.path.basename(loader.SOURCE))
+        })
+        for loader in loaders
+    }
+
+
+if __name__ == "__main__":
+    generateSources(sys.argv[1], int(sys.argv[2]) if len(sys.argv) > 2 else 1)